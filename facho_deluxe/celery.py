@@ -11,16 +11,65 @@ app = Celery('facho_deluxe')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
 # Configuración de colas
+# El enrutado de cada tarea está en CELERY_TASK_ROUTES (settings.py); las
+# tareas no fijan cola en su decorador. Cada cola tiene su propio pool de
+# workers para que una carga larga no retrase a las demás:
+#
+#   control         ticks del scheduler, masters y aggregators: tareas cortas
+#                   que abren y cierran ciclos. Nunca deben esperar.
+#                   celery -A facho_deluxe worker -Q control -c 4 -n control@%h
+#   descubrimiento  walks de descubrimiento (uno por OLT e intervalo).
+#                   celery -A facho_deluxe worker -Q descubrimiento -c 8 -n descubrimiento@%h
+#   bulk            pollers SNMP (poller_worker/columna/perfil/async). Limitados
+#                   por red y por el limitador por OLT, no por CPU: se dimensiona
+#                   ~ nº de OLTs × SNMP_LIMITE_EN_VUELO, sin superar las
+#                   conexiones de Postgres disponibles.
+#                   celery -A facho_deluxe worker -Q bulk -c 32 -n bulk@%h
+#   principal,      scripts y consultas (apps scripts y snmp_consultor), en el
+#   modo,           mismo orden de prioridad que sus fases.
+#   secundario      celery -A facho_deluxe worker -Q principal,modo,secundario -c 4 -n scripts@%h
+#   background_deletes
+#                   borrados masivos del historial, prioridad mínima.
+#                   celery -A facho_deluxe worker -Q background_deletes -c 1 -n deletes@%h
+#
+# Dentro de una cola, las prioridades de CELERY_TASK_ROUTES ordenan los
+# mensajes (Redis: 0 es la más alta).
 app.conf.task_default_queue = 'principal'
 app.conf.task_queues = {
+    'control': {
+        'exchange': 'control',
+        'routing_key': 'control',
+    },
+    'descubrimiento': {
+        'exchange': 'descubrimiento',
+        'routing_key': 'descubrimiento',
+    },
+    'bulk': {
+        'exchange': 'bulk',
+        'routing_key': 'bulk',
+    },
     'principal': {
         'exchange': 'principal',
         'routing_key': 'principal',
     },
+    'modo': {
+        'exchange': 'modo',
+        'routing_key': 'modo',
+    },
     'secundario': {
         'exchange': 'secundario',
         'routing_key': 'secundario',
-    }
+    },
+    'background_deletes': {
+        'exchange': 'background_deletes',
+        'routing_key': 'background_deletes',
+    },
+}
+app.conf.task_default_priority = 5
+app.conf.broker_transport_options = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
 }
 
 # Planificación de tareas periódicas (Beat)
@@ -29,7 +78,6 @@ app.conf.beat_schedule = {
     'tareas-snmp-programadas': {
         'task': 'snmp_scheduler.tasks.ejecutar_tareas_programadas',
         'schedule': crontab(minute='*/15'),  # Ejecutar cada 15 minutos
-        'options': {'queue': 'principal'},
     },
     # Módulo Scripts: cada 15 minutos
     'ejecutar-bloques-programados': {
@@ -43,7 +91,11 @@ app.conf.beat_schedule.update({
     'actualizar-onu-meta-cada-10-min': {
         'task': 'snmp_scheduler.tasks.update_onu_meta',
         'schedule': crontab(minute='*/10'),
-        'options': {'queue': 'principal'},
+    },
+    # Histórico de métricas: particiones, resumen diario y retención
+    'mantener-metricas-diario': {
+        'task': 'snmp_scheduler.tasks.mantener_metricas',
+        'schedule': crontab(minute=20, hour=0),
     },
 })
 
@@ -164,7 +164,6 @@ CELERY_BEAT_SCHEDULE = {
     'tareas-snmp-programadas': {
         'task': 'snmp_scheduler.tasks.ejecutar_tareas_programadas',
         'schedule': crontab(minute='*/15'),  # :00, :15, :30, :45
-        'options': {'queue': 'principal'}
     },
 
     # Tarea existente para scripts (cada hora en punto)
@@ -182,7 +181,32 @@ CELERY_BEAT_SCHEDULE = {
     }
 }
 
+# Topología de colas y pools de workers: ver facho_deluxe/celery.py
+# Prioridad dentro de cada cola (Redis): 0 la más alta, 9 la más baja
 CELERY_TASK_ROUTES = {
+    # Control: abren y cierran ciclos, por delante de todo
+    'snmp_scheduler.tasks.ejecutar_tareas_programadas': {'queue': 'control', 'priority': 0},
+    'snmp_scheduler.tasks._start_fase': {'queue': 'control', 'priority': 0},
+    'snmp_scheduler.tasks._execute_bulk_and_next': {'queue': 'control', 'priority': 0},
+    'snmp_scheduler.tasks._execute_bulk_host': {'queue': 'control', 'priority': 0},
+    'snmp_scheduler.tasks._lanzar_host': {'queue': 'control', 'priority': 1},
+    'snmp_scheduler.poller_aggregator': {'queue': 'control', 'priority': 0},
+    'snmp_scheduler.tasks.ejecutar_bulk_wrapper': {'queue': 'control', 'priority': 2},
+    'snmp_scheduler.tasks.ejecutar_bulk_perfil': {'queue': 'control', 'priority': 2},
+
+    # SNMP
+    'snmp_scheduler.tasks.ejecutar_descubrimiento': {'queue': 'descubrimiento', 'priority': 3},
+    'snmp_scheduler.tasks.poller_perfil': {'queue': 'bulk', 'priority': 4},
+    'snmp_scheduler.tasks.poller_columna': {'queue': 'bulk', 'priority': 4},
+    'snmp_scheduler.tasks.poller_async': {'queue': 'bulk', 'priority': 4},
+    'snmp_scheduler.tasks.poller_worker': {'queue': 'bulk', 'priority': 5},
+    'snmp_scheduler.tasks.ejecutar_bulk_data': {'queue': 'bulk', 'priority': 5},
+
+    # Mantenimiento
+    'snmp_scheduler.tasks.update_onu_meta': {'queue': 'secundario', 'priority': 6},
+    'snmp_scheduler.tasks.mantener_metricas': {'queue': 'secundario', 'priority': 7},
+    'snmp_scheduler.tasks.delete_history_records': {'queue': 'background_deletes', 'priority': 9},
+
     'scripts.tasks.*': {'queue': 'principal'},
     'snmp_consultor.tasks.*_principal': {'queue': 'principal'},
     'snmp_consultor.tasks.*_secundario': {'queue': 'secundario'},
@@ -199,6 +223,75 @@ CELERY_TASK_ANNOTATIONS = {
     }
 }
 
+# Planificación de cada intervalo:
+# 'fases': principal -> modo -> secundario en secuencia, el bulk de cada fase
+#          espera a todos los discovery de la fase (modo por defecto)
+# 'dag':   por host; el bulk de un host solo espera al discovery de ese host
+SNMP_SCHEDULER_MODO = 'fases'
+# En modo 'dag' cada host se lanza con un desfase fijo (crc32 del host) dentro
+# de los primeros SNMP_DESPACHO_DISPERSION_SEG del intervalo; 0 lanza todo a la
+# vez. Se reservan SNMP_DESPACHO_MARGEN_SEG al final del intervalo para terminar.
+SNMP_DESPACHO_DISPERSION_SEG = 480
+SNMP_DESPACHO_MARGEN_SEG = 300
+# Solapes: 'omitir' salta la tarea si su ejecución anterior sigue en curso,
+# 'permitir' la lanza igualmente. Las ejecuciones en curso más antiguas que
+# SNMP_EJECUCION_MAX_SEG se marcan como fallidas (abandonadas). Cada tarea se
+# ejecuta una vez por hora: con 1,5 h su siguiente turno (1 h) se omite y el
+# de después (2 h) la da por abandonada.
+SNMP_SOLAPE_POLITICA = 'omitir'
+SNMP_EJECUCION_MAX_SEG = 5400
+
+# Recolección masiva SNMP
+# 'indices': GET por chunks de índices (poller_worker), modo por defecto
+# 'columna': GETBULK de la columna completa en una sola pasada (poller_columna)
+# 'perfil':  todas las columnas de una OLT en GETBULK intercalados (poller_perfil)
+# 'async':   todas las columnas de la fase desde un proceso asyncio (poller_async)
+# Los modos de recorrido ('columna', 'perfil', 'async') borran las ONUs que no
+# aparecen en la columna recorrida; activarlos solo tras validarlos (README).
+SNMP_BULK_MODO = 'indices'
+SNMP_BULK_MAX_REPETICIONES = 25  # varbinds pedidos por cada GETBULK
+SNMP_UPDATE_LOTE = 1000  # filas por sentencia UPDATE ... FROM (VALUES ...)
+SNMP_DISCOVERY_LOTE = 1000  # filas por sentencia INSERT ... ON CONFLICT del descubrimiento
+SNMP_ASYNC_CONCURRENCIA = 200  # columnas en vuelo a la vez en poller_async
+SNMP_GET_POR_PDU = 50  # varbinds por GET en ejecutar_bulk_data
+SNMP_GET_VENTANA = 8  # GETs en vuelo a la vez por OLT en ejecutar_bulk_data
+SNMP_SESION_INACTIVA_SEG = 300  # se expulsan del pool las sesiones sin uso por más tiempo
+SNMP_SESION_VERIFICAR_SEG = 60  # sesiones sin uso por más tiempo se verifican con sysUpTime
+
+# Histórico de métricas por ONU (onu_metricas, particionada por día)
+SNMP_METRICAS_ACTIVAS = True
+SNMP_METRICAS_RETENCION_DIAS = 30  # detalle por ciclo; después solo queda el resumen diario
+SNMP_METRICAS_DIARIAS_RETENCION_DIAS = 730
+SNMP_METRICAS_DIAS_ADELANTE = 3  # particiones creadas por adelantado
+
+# Chunker adaptativo (modo 'indices'): el tamaño de chunk de cada OLT se
+# calcula con su latencia medida para que cada poller_worker dure cerca de
+# SNMP_CHUNK_OBJETIVO_SEG, lejos de su soft_time_limit de 120 s.
+SNMP_CHUNK_OBJETIVO_SEG = 60
+SNMP_CHUNK_DEFECTO = 200  # OLTs sin mediciones todavía
+SNMP_CHUNK_MIN = 50
+SNMP_CHUNK_MAX = 2000
+SNMP_PDU_MIN = 10  # varbinds por GET en OLTs con timeouts frecuentes
+SNMP_PDU_MAX = 60
+SNMP_RESULTADO_MAX_ERRORES = 20  # errores de muestra que cada worker devuelve al aggregator
+
+# Unión de los chunks de poller_worker:
+# 'chord':    chord de Celery (un resultado por chunk en el result backend django-db),
+#             modo por defecto
+# 'contador': contadores en Redis; el último chunk encola poller_aggregator
+SNMP_POLLER_RESULTADOS = 'chord'
+SNMP_CONTADOR_TTL_SEG = 3600  # caducidad del contador de una ejecución
+
+# Limitador de carga por OLT compartido por todos los workers (Redis).
+# Discovery, bulk y ejecuciones manuales piden turno antes de cada PDU.
+SNMP_LIMITE_ACTIVO = True
+SNMP_LIMITE_REDIS_URL = None  # None: el mismo Redis que CELERY_BROKER_URL
+SNMP_LIMITE_EN_VUELO = 4  # peticiones simultáneas por OLT
+SNMP_LIMITE_VARBINDS_SEG = 500  # varbinds por segundo por OLT
+SNMP_LIMITE_RAFAGA = 500  # capacidad del cubo de tokens
+SNMP_LIMITE_TTL_SEG = 30  # caducidad de un turno si el worker muere sin liberarlo
+SNMP_LIMITE_ESPERA_SEG = 30  # tras esta espera se envía sin turno
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
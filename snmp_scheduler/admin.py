@@ -4,15 +4,15 @@ from django.urls import path, reverse
 from django.http import HttpResponseRedirect
 from django.db import models
 from django.db.models import Q, Case, When, Value, FloatField, F
-from django.db.models.functions import Replace, Cast
 from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.template.response import TemplateResponse
 from django.utils import timezone
 from django.utils.timezone import localtime
-from .models import TareaSNMP, EjecucionTareaSNMP, OnuDato
+from .models import TareaSNMP, EjecucionTareaSNMP, OnuDato, PerfilRendimientoOLT
 from .tasks.handlers import TASK_HANDLERS
 from .tasks.delete import delete_history_records
+from .tasks.estado_tarea import conciliar_en_curso
 
 # Modelo proxy para el Supervisor
 class Supervisor(TareaSNMP):
@@ -32,7 +32,10 @@ class EjecucionTareaSNMPInline(admin.TabularInline):
 class TareaSNMPAdmin(admin.ModelAdmin):
     save_on_top = True
     inlines = [EjecucionTareaSNMPInline]
-    fields = ['nombre', 'host_name', 'host_ip', 'comunidad', 'tipo', 'intervalo', 'modo', 'activa']
+    fields = [
+        'nombre', 'host_name', 'host_ip', 'comunidad', 'tipo', 'intervalo', 'modo', 'activa',
+        'ejecuciones_omitidas', 'ejecuciones_abandonadas', 'ultimo_solape',
+    ]
     list_display = [
         'nombre',
         'host_ip',
@@ -42,11 +45,18 @@ class TareaSNMPAdmin(admin.ModelAdmin):
         'activa',
         'ultima_ejecucion',
         'estado_actual',
+        'tasa_exito',
+        'ejecuciones_omitidas',
     ]
+    readonly_fields = ['ejecuciones_omitidas', 'ejecuciones_abandonadas', 'ultimo_solape']
     list_filter = ('tipo', 'intervalo', 'modo', 'activa')
     search_fields = ('nombre', 'host_ip')
     actions = ['ejecutar_ahora', 'activar_tareas', 'desactivar_tareas']
 
+    def get_queryset(self, request):
+        # Último estado desde EstadoTareaSNMP, en la misma consulta
+        return super().get_queryset(request).select_related('estado')
+
     def get_urls(self):
         urls = super().get_urls()
         my_urls = [
@@ -88,15 +98,20 @@ class TareaSNMPAdmin(admin.ModelAdmin):
     desactivar_tareas.short_description = "Desactivar tareas seleccionadas"
 
     def estado_actual(self, obj):
-        última = obj.ejecuciones.first()
-        return última.estado if última else '--'
+        estado = getattr(obj, 'estado', None)
+        return estado.ultimo_estado if estado and estado.ultimo_estado else '--'
     estado_actual.short_description = 'Último Estado'
 
     def ultima_ejecucion(self, obj):
-        última = obj.ejecuciones.first()
-        return última.inicio if última else '--'
+        estado = getattr(obj, 'estado', None)
+        return estado.ultimo_inicio if estado and estado.ultimo_inicio else '--'
     ultima_ejecucion.short_description = 'Última Ejecución'
 
+    def tasa_exito(self, obj):
+        estado = getattr(obj, 'estado', None)
+        return f"{estado.tasa_exito:.0%}" if estado and estado.cerradas else '--'
+    tasa_exito.short_description = 'Éxito'
+
 @admin.register(Supervisor)
 class SupervisorAdmin(admin.ModelAdmin):
     change_list_template = 'admin/snmp_scheduler/supervisor.html'
@@ -242,29 +257,12 @@ class SupervisorAdmin(admin.ModelAdmin):
     def changelist_view(self, request, extra_context=None):
         current_time = timezone.now()
         
-        # Obtener todas las tareas activas
-        tareas = TareaSNMP.objects.filter(activa=True).annotate(
-            ultima_ejecucion_fecha=models.Subquery(
-                EjecucionTareaSNMP.objects.filter(
-                    tarea=models.OuterRef('pk')
-                ).order_by('-inicio').values('inicio')[:1]
-            ),
-            ultimo_estado=models.Subquery(
-                EjecucionTareaSNMP.objects.filter(
-                    tarea=models.OuterRef('pk')
-                ).order_by('-inicio').values('estado')[:1]
-            ),
-            duracion=models.Subquery(
-                EjecucionTareaSNMP.objects.filter(
-                    tarea=models.OuterRef('pk')
-                ).order_by('-inicio').values(
-                    duracion=models.ExpressionWrapper(
-                        models.F('fin') - models.F('inicio'),
-                        output_field=models.DurationField()
-                    )
-                )[:1]
-            )
-        ).order_by('intervalo', 'nombre')
+        # Obtener todas las tareas activas con su EstadoTareaSNMP (una sola consulta)
+        tareas = list(TareaSNMP.objects.filter(activa=True).select_related('estado').order_by('intervalo', 'nombre'))
+        # en_curso se recalcula con las ejecuciones abiertas reales antes de mostrarlo
+        conciliar_en_curso([
+            t.estado for t in tareas if getattr(t, 'estado', None) and t.estado.en_curso
+        ])
 
         # Organizar tareas por intervalos
         intervalos = {
@@ -276,6 +274,11 @@ class SupervisorAdmin(admin.ModelAdmin):
 
         for tarea in tareas:
             try:
+                resumen = getattr(tarea, 'estado', None)
+                tarea.ultima_ejecucion_fecha = resumen.ultimo_inicio if resumen else None
+                tarea.ultimo_estado = resumen.ultimo_estado if resumen else None
+                tarea.duracion = resumen.ultima_duracion if resumen else None
+
                 intervalo = self.get_task_interval(task=tarea)
                 intervalo_str = str(intervalo).zfill(2)
                 
@@ -304,6 +307,8 @@ class SupervisorAdmin(admin.ModelAdmin):
                     'duracion': str(tarea.duracion).split('.')[0] if tarea.duracion else '--',
                     'proxima_ejecucion': localtime(proxima_ejecucion).strftime('%H:%M'),
                     'minutos_restantes': minutos_restantes,
+                    'en_curso': resumen.en_curso if resumen else 0,
+                    'tasa_exito': f"{resumen.tasa_exito:.0%}" if resumen and resumen.cerradas else '--',
                     'intervalo': intervalo
                 }
                 intervalos[intervalo_str]['tareas'].append(tarea_info)
@@ -363,6 +368,12 @@ class EjecucionTareaSNMPAdmin(admin.ModelAdmin):
         )
     borrar_seleccion_async.short_description = "Borrar historial seleccionado (Async)"
 
+@admin.register(PerfilRendimientoOLT)
+class PerfilRendimientoOLTAdmin(admin.ModelAdmin):
+    list_display = ('host_ip', 'latencia_varbind_ms', 'tasa_timeouts', 'muestras', 'actualizado')
+    readonly_fields = ('host_ip', 'latencia_varbind_ms', 'tasa_timeouts', 'muestras', 'actualizado')
+    search_fields = ('host_ip',)
+
 @admin.register(OnuDato)
 class OnuDatoAdmin(admin.ModelAdmin):
     list_display = [
@@ -407,36 +418,17 @@ class OnuDatoAdmin(admin.ModelAdmin):
                     return queryset
 
                 if self.value() == 'no-distance':
-                    return queryset.filter(
-                        Q(distancia_m__in=['No Distancia', 'Error formato', '']) |
-                        Q(distancia_m__isnull=True)
-                    )
-
-                # Filtrar registros válidos y convertir a número
-                valid_records = queryset.exclude(
-                    Q(distancia_m__in=['No Distancia', 'Error formato', '']) |
-                    Q(distancia_m__isnull=True)
-                ).annotate(
-                    clean_distance=Cast(
-                        Replace(
-                            Replace(
-                                Replace('distancia_m', Value(' km'), Value('')),
-                                Value(','), Value('.')
-                            ),
-                            Value(' '), Value('')
-                        ),
-                        FloatField()
-                    )
-                )
-                
+                    return queryset.filter(distancia_metros__isnull=True)
+
+                # Rango sobre la columna tipada (metros, con índice)
                 if self.value() == '0-5':
-                    return valid_records.filter(clean_distance__gte=0, clean_distance__lt=5)
+                    return queryset.filter(distancia_metros__gte=0, distancia_metros__lt=5000)
                 elif self.value() == '5-10':
-                    return valid_records.filter(clean_distance__gte=5, clean_distance__lt=10)
+                    return queryset.filter(distancia_metros__gte=5000, distancia_metros__lt=10000)
                 elif self.value() == '10-15':
-                    return valid_records.filter(clean_distance__gte=10, clean_distance__lt=15)
+                    return queryset.filter(distancia_metros__gte=10000, distancia_metros__lt=15000)
                 elif self.value() == '15+':
-                    return valid_records.filter(clean_distance__gte=15)
+                    return queryset.filter(distancia_metros__gte=15000)
                 
                 return queryset
         
@@ -445,9 +437,3 @@ class OnuDatoAdmin(admin.ModelAdmin):
             ('modelo_onu', admin.AllValuesFieldListFilter),
             DistanceRangeFilter,
         ]
-
-    class Meta:
-        indexes = [
-            models.Index(fields=['host', 'modelo_onu']),
-            models.Index(fields=['distancia_m']),
-        ]
\ No newline at end of file
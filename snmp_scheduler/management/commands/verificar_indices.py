@@ -0,0 +1,168 @@
+# snmp_scheduler/management/commands/verificar_indices.py
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from snmp_scheduler.models import OnuDato, EjecucionTareaSNMP
+
+MODELOS = (OnuDato, EjecucionTareaSNMP)
+
+# Índices con nombre creados por las migraciones 0005 y 0006. El índice sin
+# nombre de snmpindexonu es el original de la tabla y no se comprueba.
+INDICES = {
+    'onu_datos_host_indice_idx',
+    'onu_datos_host_modelo_idx',
+    'onu_datos_distancia_idx',
+    'onu_datos_potencia_rx_idx',
+    'ejec_tarea_inicio_idx',
+    'ejec_en_curso_idx',
+}
+
+
+def _indices_por_host():
+    """Índices de onu_datos cuya primera columna es host: cualquiera sirve a un filtro por host."""
+    return {
+        indice.name for indice in OnuDato._meta.indexes
+        if indice.name in INDICES and indice.fields[0] == 'host'
+    }
+
+
+def _consultas():
+    """
+    Consultas representativas de los pollers, el descubrimiento, el
+    scheduler y el admin, con los índices que el plan puede usar.
+    """
+    por_host = _indices_por_host()
+    return [
+        (
+            "ONUs del host (poller_master, descubrimiento)",
+            OnuDato.objects.filter(host='OLT').values_list('id', 'snmpindexonu', 'potencia_rx'),
+            por_host,
+        ),
+        (
+            "ONUs de un chunk (poller_worker, aggregator)",
+            OnuDato.objects.filter(host='OLT', snmpindexonu__in=['1.1', '1.2']).values('id'),
+            por_host,
+        ),
+        (
+            "Filtro por host y modelo (admin)",
+            OnuDato.objects.filter(host='OLT', modelo_onu='HG8245H').values('id'),
+            por_host,
+        ),
+        (
+            "Rango de distancia (admin, programador)",
+            OnuDato.objects.filter(distancia_metros__gte=5000, distancia_metros__lt=10000).values('id'),
+            {'onu_datos_distancia_idx'},
+        ),
+        (
+            "Historial de una tarea (inline del admin)",
+            EjecucionTareaSNMP.objects.filter(tarea_id=1).order_by('-inicio').values('inicio')[:1],
+            {'ejec_tarea_inicio_idx'},
+        ),
+        (
+            "Ejecuciones en curso (cierre de abandonadas)",
+            EjecucionTareaSNMP.objects.filter(tarea_id__in=[1, 2], estado='E').values('tarea_id'),
+            {'ejec_en_curso_idx'},
+        ),
+    ]
+
+
+def _indices_del_plan(nodo):
+    """Nombres de índice usados en un nodo de EXPLAIN (FORMAT JSON) y sus hijos."""
+    nombres = set()
+    if 'Index Name' in nodo:
+        nombres.add(nodo['Index Name'])
+    for hijo in nodo.get('Plans', []):
+        nombres |= _indices_del_plan(hijo)
+    return nombres
+
+
+class Command(BaseCommand):
+    help = (
+        "Comprueba que los índices de onu_datos y de las ejecuciones existen y son válidos, "
+        "y que las consultas frecuentes los usan en su plan"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reparar',
+            action='store_true',
+            help="Crea (CONCURRENTLY) los índices que faltan o quedaron inválidos"
+        )
+
+    def handle(self, *args, **options):
+        fallos = self._verificar_indices(options['reparar'])
+        fallos += self._verificar_planes()
+
+        if fallos:
+            raise CommandError(f"{fallos} comprobación(es) fallida(s)")
+        self.stdout.write(self.style.SUCCESS("✅ Índices y planes correctos"))
+
+    def _estado(self, nombre):
+        """True/False según indisvalid, o None si el índice no existe."""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT i.indisvalid
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = %s
+            """, [nombre])
+            fila = cursor.fetchone()
+        return fila[0] if fila else None
+
+    def _verificar_indices(self, reparar):
+        fallos = 0
+        for modelo in MODELOS:
+            tabla = modelo._meta.db_table
+            for indice in modelo._meta.indexes:
+                if indice.name not in INDICES:
+                    continue
+                valido = self._estado(indice.name)
+                if valido:
+                    self.stdout.write(f"✔ {tabla}.{indice.name}")
+                    continue
+
+                motivo = "no existe" if valido is None else "inválido (CREATE CONCURRENTLY interrumpido)"
+                if not reparar:
+                    self.stdout.write(self.style.ERROR(f"✖ {tabla}.{indice.name}: {motivo}"))
+                    fallos += 1
+                    continue
+
+                self.stdout.write(f"🔧 {tabla}.{indice.name}: {motivo}, recreando…")
+                with connection.schema_editor(atomic=False) as editor:
+                    if valido is False:
+                        editor.remove_index(modelo, indice, concurrently=True)
+                    editor.add_index(modelo, indice, concurrently=True)
+                if not self._estado(indice.name):
+                    self.stdout.write(self.style.ERROR(f"✖ {tabla}.{indice.name}: no se pudo recrear"))
+                    fallos += 1
+        return fallos
+
+    def _verificar_planes(self):
+        """
+        EXPLAIN de cada consulta con enable_seqscan desactivado: en una base
+        pequeña el planificador prefiere leer la tabla entera, así se
+        comprueba que el índice es utilizable y no el tamaño actual.
+        """
+        fallos = 0
+        for descripcion, queryset, esperados in _consultas():
+            sql, params = queryset.query.sql_with_params()
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+
+            usados = _indices_del_plan(plan[0]['Plan'])
+            if esperados & usados:
+                self.stdout.write(f"✔ {descripcion}: {', '.join(sorted(esperados & usados))}")
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f"✖ {descripcion}: se esperaba {' o '.join(sorted(esperados))}, "
+                    f"el plan usa {sorted(usados) or 'Seq Scan'}"
+                ))
+                fallos += 1
+        return fallos
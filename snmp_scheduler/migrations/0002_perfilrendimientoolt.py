@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snmp_scheduler', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilRendimientoOLT',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('host_ip', models.GenericIPAddressField(protocol='IPv4', unique=True, verbose_name='IP del OLT')),
+                ('latencia_varbind_ms', models.FloatField(default=0, verbose_name='Latencia media por varbind (ms)')),
+                ('tasa_timeouts', models.FloatField(default=0, verbose_name='Tasa de timeouts')),
+                ('muestras', models.PositiveIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Perfil de rendimiento OLT',
+                'verbose_name_plural': 'Perfiles de rendimiento OLT',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snmp_scheduler', '0002_perfilrendimientoolt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tareasnmp',
+            name='ejecuciones_omitidas',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Intervalos saltados porque la ejecución anterior no había terminado', verbose_name='Ejecuciones omitidas'),
+        ),
+        migrations.AddField(
+            model_name='tareasnmp',
+            name='ejecuciones_abandonadas',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Ejecuciones marcadas como fallidas por superar SNMP_EJECUCION_MAX_SEG', verbose_name='Ejecuciones abandonadas'),
+        ),
+        migrations.AddField(
+            model_name='tareasnmp',
+            name='ultimo_solape',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
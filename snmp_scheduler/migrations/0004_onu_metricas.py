@@ -0,0 +1,88 @@
+# Generated by Django 3.2.25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snmp_scheduler', '0003_tareasnmp_metricas_solape'),
+    ]
+
+    operations = [
+        # Histórico append-only de métricas por ONU, particionado por día.
+        # Las particiones diarias las crea snmp_scheduler.tasks.mantener_metricas;
+        # la partición DEFAULT recoge lo que llegue antes de que existan.
+        migrations.RunSQL(
+            sql="""
+                CREATE TABLE onu_metricas (
+                    id          bigserial,
+                    tiempo      timestamptz NOT NULL,
+                    onu_id      integer     NOT NULL,
+                    potencia_rx real,
+                    potencia_tx real,
+                    estado      smallint,
+                    distancia_m integer
+                ) PARTITION BY RANGE (tiempo);
+                CREATE INDEX onu_metricas_onu_tiempo_idx ON onu_metricas (onu_id, tiempo);
+                CREATE TABLE onu_metricas_default PARTITION OF onu_metricas DEFAULT;
+
+                CREATE TABLE onu_metricas_diarias (
+                    id              bigserial PRIMARY KEY,
+                    fecha           date    NOT NULL,
+                    onu_id          integer NOT NULL,
+                    potencia_rx_min real,
+                    potencia_rx_avg real,
+                    potencia_rx_max real,
+                    potencia_tx_avg real,
+                    distancia_m_avg integer,
+                    muestras        integer NOT NULL,
+                    muestras_online integer NOT NULL,
+                    UNIQUE (onu_id, fecha)
+                );
+            """,
+            reverse_sql="""
+                DROP TABLE IF EXISTS onu_metricas_diarias;
+                DROP TABLE IF EXISTS onu_metricas CASCADE;
+            """,
+        ),
+        migrations.CreateModel(
+            name='OnuMetrica',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('tiempo', models.DateTimeField()),
+                ('onu_id', models.IntegerField()),
+                ('potencia_rx', models.FloatField(blank=True, null=True)),
+                ('potencia_tx', models.FloatField(blank=True, null=True)),
+                ('estado', models.SmallIntegerField(blank=True, null=True)),
+                ('distancia_m', models.IntegerField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Métrica ONU',
+                'verbose_name_plural': 'Métricas ONU',
+                'db_table': 'onu_metricas',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='OnuMetricaDiaria',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('onu_id', models.IntegerField()),
+                ('potencia_rx_min', models.FloatField(blank=True, null=True)),
+                ('potencia_rx_avg', models.FloatField(blank=True, null=True)),
+                ('potencia_rx_max', models.FloatField(blank=True, null=True)),
+                ('potencia_tx_avg', models.FloatField(blank=True, null=True)),
+                ('distancia_m_avg', models.IntegerField(blank=True, null=True)),
+                ('muestras', models.IntegerField()),
+                ('muestras_online', models.IntegerField()),
+            ],
+            options={
+                'verbose_name': 'Métrica diaria ONU',
+                'verbose_name_plural': 'Métricas diarias ONU',
+                'db_table': 'onu_metricas_diarias',
+                'managed': False,
+            },
+        ),
+    ]
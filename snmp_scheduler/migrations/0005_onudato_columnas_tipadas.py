@@ -0,0 +1,183 @@
+# Generated by Django 3.2.25
+
+import struct
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import migrations, models
+
+# Copia congelada de los conversores de tasks/normalizacion.py en el momento
+# de esta migración: cambios posteriores en la app no deben alterarla.
+HUAWEI_SIN_DATO = 2147483647
+HUAWEI_OLT_RX_DESPLAZAMIENTO = 10000
+
+
+def _numero(valor):
+    try:
+        return float(str(valor).strip().strip('"'))
+    except (TypeError, ValueError):
+        return None
+
+
+def a_dbm(valor):
+    texto = str(valor or '').strip().strip('"')
+    v = _numero(texto)
+    if v is None or abs(v) >= HUAWEI_SIN_DATO:
+        return None
+    if '.' not in texto:
+        v = v / 100
+    return round(v, 2)
+
+
+def a_dbm_olt_rx(valor):
+    texto = str(valor or '').strip().strip('"')
+    v = _numero(texto)
+    if v is None or abs(v) >= HUAWEI_SIN_DATO:
+        return None
+    if '.' not in texto:
+        v = (v - HUAWEI_OLT_RX_DESPLAZAMIENTO) / 100
+    return round(v, 2)
+
+
+def a_metros(valor):
+    texto = str(valor or '').strip().strip('"')
+    if texto.endswith('km'):
+        km = _numero(texto[:-2])
+        return int(round(km * 1000)) if km is not None else None
+    v = _numero(texto)
+    if v is None or v < 0:
+        return None
+    return int(v)
+
+
+def a_fecha(valor):
+    texto = str(valor or '').strip().strip('"')
+    if not texto:
+        return None
+
+    for formato in ('%Y-%m-%d %H:%M:%S%z', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d,%H:%M:%S.%f,%z'):
+        try:
+            fecha = datetime.strptime(texto.replace('Z', '+0000'), formato)
+            return fecha if fecha.tzinfo else fecha.replace(tzinfo=dt_timezone.utc)
+        except ValueError:
+            continue
+
+    partes = texto.split()
+    if len(partes) in (8, 11) and all(len(p) <= 2 for p in partes):
+        try:
+            octetos = bytes(int(p, 16) for p in partes)
+        except ValueError:
+            return None
+    elif len(texto) in (8, 11):
+        octetos = texto.encode('latin-1', errors='ignore')
+    else:
+        return None
+
+    try:
+        anio, mes, dia, hora, minuto, segundo, _ = struct.unpack('>HBBBBBB', octetos[:8])
+        zona = dt_timezone.utc
+        if len(octetos) == 11:
+            signo = -1 if octetos[8:9] == b'-' else 1
+            zona = dt_timezone(signo * timedelta(hours=octetos[9], minutes=octetos[10]))
+        return datetime(anio, mes, dia, hora, minuto, segundo, tzinfo=zona)
+    except (struct.error, ValueError):
+        return None
+
+
+# Columna de texto -> conversión, en el orden de las columnas tipadas del UPDATE
+CONVERSIONES = (
+    ('potencia_rx', a_dbm_olt_rx),
+    ('potencia_tx', a_dbm),
+    ('distancia_m', a_metros),
+    ('last_down_time', a_fecha),
+)
+
+
+def rellenar_tipados(apps, schema_editor):
+    """Interpreta una vez el texto ya guardado para las columnas nuevas."""
+    from psycopg2.extras import execute_values
+
+    origen = [columna for columna, _ in CONVERSIONES]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT id, {', '.join(origen)} FROM onu_datos")
+        filas = [
+            (onu_id, *[convertir(valor) for (_, convertir), valor in zip(CONVERSIONES, valores)])
+            for onu_id, *valores in cursor.fetchall()
+        ]
+
+        execute_values(
+            cursor.cursor,
+            """
+            UPDATE onu_datos AS o
+            SET potencia_rx_dbm = v.potencia_rx_dbm::double precision,
+                potencia_tx_dbm = v.potencia_tx_dbm::double precision,
+                distancia_metros = v.distancia_metros::integer,
+                last_down_fecha = v.last_down_fecha::timestamptz
+            FROM (VALUES %s) AS v(id, potencia_rx_dbm, potencia_tx_dbm, distancia_metros, last_down_fecha)
+            WHERE o.id = v.id
+            """,
+            filas,
+            page_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snmp_scheduler', '0004_onu_metricas'),
+    ]
+
+    operations = [
+        # onu_datos no la gestiona Django (managed=False): las columnas e
+        # índices se crean con SQL y el estado del modelo se declara aparte
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE onu_datos
+                    ADD COLUMN IF NOT EXISTS potencia_rx_dbm double precision,
+                    ADD COLUMN IF NOT EXISTS potencia_tx_dbm double precision,
+                    ADD COLUMN IF NOT EXISTS distancia_metros integer,
+                    ADD COLUMN IF NOT EXISTS last_down_fecha timestamptz;
+                CREATE INDEX IF NOT EXISTS onu_datos_distancia_idx ON onu_datos (distancia_metros);
+                CREATE INDEX IF NOT EXISTS onu_datos_potencia_rx_idx ON onu_datos (potencia_rx_dbm);
+            """,
+            reverse_sql="""
+                DROP INDEX IF EXISTS onu_datos_potencia_rx_idx;
+                DROP INDEX IF EXISTS onu_datos_distancia_idx;
+                ALTER TABLE onu_datos
+                    DROP COLUMN IF EXISTS last_down_fecha,
+                    DROP COLUMN IF EXISTS distancia_metros,
+                    DROP COLUMN IF EXISTS potencia_tx_dbm,
+                    DROP COLUMN IF EXISTS potencia_rx_dbm;
+            """,
+            state_operations=[
+                migrations.AddField(
+                    model_name='onudato',
+                    name='potencia_rx_dbm',
+                    field=models.FloatField(blank=True, db_column='potencia_rx_dbm', null=True),
+                ),
+                migrations.AddField(
+                    model_name='onudato',
+                    name='potencia_tx_dbm',
+                    field=models.FloatField(blank=True, db_column='potencia_tx_dbm', null=True),
+                ),
+                migrations.AddField(
+                    model_name='onudato',
+                    name='distancia_metros',
+                    field=models.IntegerField(blank=True, db_column='distancia_metros', null=True),
+                ),
+                migrations.AddField(
+                    model_name='onudato',
+                    name='last_down_fecha',
+                    field=models.DateTimeField(blank=True, db_column='last_down_fecha', null=True),
+                ),
+                migrations.AddIndex(
+                    model_name='onudato',
+                    index=models.Index(fields=['distancia_metros'], name='onu_datos_distancia_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='onudato',
+                    index=models.Index(fields=['potencia_rx_dbm'], name='onu_datos_potencia_rx_idx'),
+                ),
+            ],
+        ),
+        migrations.RunPython(rellenar_tipados, migrations.RunPython.noop),
+    ]
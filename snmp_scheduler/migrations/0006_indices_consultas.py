@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY no puede ir dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('snmp_scheduler', '0005_onudato_columnas_tipadas'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ejecuciontareasnmp',
+            index=models.Index(fields=['tarea', '-inicio'], name='ejec_tarea_inicio_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ejecuciontareasnmp',
+            index=models.Index(condition=models.Q(estado='E'), fields=['tarea'], name='ejec_en_curso_idx'),
+        ),
+        # onu_datos no la gestiona Django (managed=False): los índices se crean
+        # con SQL, una sentencia por índice para que CONCURRENTLY no quede en
+        # una transacción implícita
+        migrations.RunSQL(
+            sql=[
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS onu_datos_host_indice_idx "
+                "ON onu_datos (host, snmpindexonu)",
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS onu_datos_host_modelo_idx "
+                "ON onu_datos (host, modelo_onu)",
+            ],
+            reverse_sql=[
+                "DROP INDEX CONCURRENTLY IF EXISTS onu_datos_host_modelo_idx",
+                "DROP INDEX CONCURRENTLY IF EXISTS onu_datos_host_indice_idx",
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='onudato',
+                    index=models.Index(fields=['host', 'snmpindexonu'], name='onu_datos_host_indice_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='onudato',
+                    index=models.Index(fields=['host', 'modelo_onu'], name='onu_datos_host_modelo_idx'),
+                ),
+            ],
+        ),
+    ]
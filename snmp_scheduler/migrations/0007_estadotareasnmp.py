@@ -0,0 +1,69 @@
+# Generated by Django 3.2.25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snmp_scheduler', '0006_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoTareaSNMP',
+            fields=[
+                ('tarea', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estado', serialize=False, to='snmp_scheduler.tareasnmp')),
+                ('ultimo_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Último inicio')),
+                ('ultimo_fin', models.DateTimeField(blank=True, null=True, verbose_name='Último fin')),
+                ('ultimo_estado', models.CharField(blank=True, choices=[('P', 'Pendiente'), ('E', 'En Ejecución'), ('C', 'Completada'), ('F', 'Fallida')], max_length=1, verbose_name='Último estado')),
+                ('ultima_duracion', models.DurationField(blank=True, null=True, verbose_name='Última duración')),
+                ('tasa_exito', models.FloatField(default=0, verbose_name='Tasa de éxito (media móvil)')),
+                ('cerradas', models.PositiveIntegerField(default=0, verbose_name='Ejecuciones terminadas')),
+                ('en_curso', models.PositiveIntegerField(default=0, verbose_name='Ejecuciones en curso')),
+                ('actualizado', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Estado de tarea',
+                'verbose_name_plural': 'Estados de tareas',
+            },
+        ),
+        # Estado inicial desde el historial (una única vez): última ejecución,
+        # tasa de éxito de las 10 últimas terminadas y ejecuciones en curso
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO snmp_scheduler_estadotareasnmp (
+                    tarea_id, ultimo_inicio, ultimo_fin, ultimo_estado, ultima_duracion,
+                    tasa_exito, cerradas, en_curso, actualizado
+                )
+                SELECT t.id, u.inicio, u.fin, u.estado, u.fin - u.inicio,
+                       COALESCE(r.tasa, 0), c.cerradas, c.en_curso, now()
+                FROM snmp_scheduler_tareasnmp t
+                JOIN LATERAL (
+                    SELECT inicio, fin, estado
+                    FROM snmp_scheduler_ejecuciontareasnmp
+                    WHERE tarea_id = t.id
+                    ORDER BY inicio DESC
+                    LIMIT 1
+                ) u ON true
+                LEFT JOIN LATERAL (
+                    SELECT AVG((estado = 'C')::int)::double precision AS tasa
+                    FROM (
+                        SELECT estado
+                        FROM snmp_scheduler_ejecuciontareasnmp
+                        WHERE tarea_id = t.id AND estado IN ('C', 'F')
+                        ORDER BY inicio DESC
+                        LIMIT 10
+                    ) ultimas
+                ) r ON true
+                LEFT JOIN LATERAL (
+                    SELECT COUNT(*) FILTER (WHERE estado IN ('C', 'F')) AS cerradas,
+                           COUNT(*) FILTER (WHERE estado = 'E') AS en_curso
+                    FROM snmp_scheduler_ejecuciontareasnmp
+                    WHERE tarea_id = t.id
+                ) c ON true
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+
+def crear_particiones(apps, schema_editor):
+    """
+    Particiones de hoy y de los próximos SNMP_METRICAS_DIAS_ADELANTE días,
+    para que las muestras no caigan en DEFAULT hasta el primer
+    mantener_metricas. Las filas que ya estén en DEFAULT se mueven.
+    """
+    hoy = timezone.localdate()
+    adelante = getattr(settings, 'SNMP_METRICAS_DIAS_ADELANTE', 3)
+    with schema_editor.connection.cursor() as cursor:
+        for i in range(adelante + 1):
+            dia = hoy + timedelta(days=i)
+            nombre = f"onu_metricas_{dia:%Y%m%d}"
+            desde = timezone.make_aware(datetime.combine(dia, time.min))
+            hasta = timezone.make_aware(datetime.combine(dia + timedelta(days=1), time.min))
+
+            cursor.execute("SELECT to_regclass(%s)", [nombre])
+            if cursor.fetchone()[0]:
+                continue
+            cursor.execute("LOCK TABLE onu_metricas_default IN EXCLUSIVE MODE")
+            cursor.execute(f"CREATE TABLE {nombre} (LIKE onu_metricas INCLUDING DEFAULTS)")
+            cursor.execute(f"""
+                WITH movidas AS (
+                    DELETE FROM onu_metricas_default
+                    WHERE tiempo >= %s AND tiempo < %s
+                    RETURNING *
+                )
+                INSERT INTO {nombre} SELECT * FROM movidas
+            """, [desde, hasta])
+            cursor.execute(f"""
+                ALTER TABLE onu_metricas ATTACH PARTITION {nombre}
+                FOR VALUES FROM (%s) TO (%s)
+            """, [desde, hasta])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snmp_scheduler', '0007_estadotareasnmp'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_particiones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    pot_rx (hwGponOntOpticalDdmOltRxOntPower) lleva un desplazamiento de
+    10000 centésimas que antes no se restaba: los valores guardados quedaron
+    100 dBm por encima. Una potencia real nunca es positiva, así que solo se
+    corrigen los mayores de 50 dBm (y la migración es idempotente).
+    """
+
+    dependencies = [
+        ('snmp_scheduler', '0008_onu_metricas_particiones'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                UPDATE onu_datos
+                SET potencia_rx_dbm = potencia_rx_dbm - 100
+                WHERE potencia_rx_dbm > 50;
+
+                UPDATE onu_metricas
+                SET potencia_rx = potencia_rx - 100
+                WHERE potencia_rx > 50;
+
+                UPDATE onu_metricas_diarias
+                SET potencia_rx_min = CASE WHEN potencia_rx_min > 50 THEN potencia_rx_min - 100 ELSE potencia_rx_min END,
+                    potencia_rx_avg = CASE WHEN potencia_rx_avg > 50 THEN potencia_rx_avg - 100 ELSE potencia_rx_avg END,
+                    potencia_rx_max = CASE WHEN potencia_rx_max > 50 THEN potencia_rx_max - 100 ELSE potencia_rx_max END
+                WHERE potencia_rx_max > 50;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    onu_metricas pasa a una fila por ONU y hora: registrar_metricas hace
+    upsert sobre (onu_id, tiempo). Las filas dispersas ya guardadas (una por
+    columna sondeada) se fusionan antes de crear el índice único, quedándose
+    con el último valor no nulo de cada columna dentro de la hora.
+    """
+
+    dependencies = [
+        ('snmp_scheduler', '0009_corregir_potencia_rx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+                WITH dispersas AS (
+                    DELETE FROM onu_metricas RETURNING *
+                )
+                INSERT INTO onu_metricas (tiempo, onu_id, potencia_rx, potencia_tx, estado, distancia_m)
+                SELECT date_trunc('hour', tiempo), onu_id,
+                       (array_agg(potencia_rx ORDER BY tiempo DESC) FILTER (WHERE potencia_rx IS NOT NULL))[1],
+                       (array_agg(potencia_tx ORDER BY tiempo DESC) FILTER (WHERE potencia_tx IS NOT NULL))[1],
+                       (array_agg(estado ORDER BY tiempo DESC) FILTER (WHERE estado IS NOT NULL))[1],
+                       (array_agg(distancia_m ORDER BY tiempo DESC) FILTER (WHERE distancia_m IS NOT NULL))[1]
+                FROM dispersas
+                GROUP BY date_trunc('hour', tiempo), onu_id;
+
+                DROP INDEX onu_metricas_onu_tiempo_idx;
+                CREATE UNIQUE INDEX onu_metricas_onu_tiempo_idx ON onu_metricas (onu_id, tiempo);
+            """,
+            reverse_sql="""
+                DROP INDEX onu_metricas_onu_tiempo_idx;
+                CREATE INDEX onu_metricas_onu_tiempo_idx ON onu_metricas (onu_id, tiempo);
+            """,
+        ),
+    ]
@@ -62,6 +62,22 @@ class TareaSNMP(models.Model):
         help_text="Contador actualizado automáticamente"
     )
 
+    # Métricas de solape: el scheduler no lanza una tarea cuya ejecución
+    # anterior sigue en curso
+    ejecuciones_omitidas = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Ejecuciones omitidas",
+        help_text="Intervalos saltados porque la ejecución anterior no había terminado"
+    )
+    ejecuciones_abandonadas = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Ejecuciones abandonadas",
+        help_text="Ejecuciones marcadas como fallidas por superar SNMP_EJECUCION_MAX_SEG"
+    )
+    ultimo_solape = models.DateTimeField(null=True, blank=True, editable=False)
+
     oid_consulta = models.CharField(
         max_length=255,
         blank=True,
@@ -126,6 +142,12 @@ class OnuDato(models.Model):
     distancia_m        = models.CharField(max_length=50,  db_column='distancia_m',        null=True, blank=True)
     modelo_onu         = models.CharField(max_length=100, db_column='modelo_onu',         null=True, blank=True)
 
+    # ——— Valores tipados, derivados del texto al escribir (tasks/normalizacion.py) ———
+    potencia_rx_dbm    = models.FloatField(db_column='potencia_rx_dbm',       null=True, blank=True)
+    potencia_tx_dbm    = models.FloatField(db_column='potencia_tx_dbm',       null=True, blank=True)
+    distancia_metros   = models.IntegerField(db_column='distancia_metros',    null=True, blank=True)
+    last_down_fecha    = models.DateTimeField(db_column='last_down_fecha',    null=True, blank=True)
+
     class Meta:
         managed = False  # Siguen usando la tabla existente
         db_table = 'onu_datos'
@@ -134,6 +156,11 @@ class OnuDato(models.Model):
         unique_together = (('host', 'snmpindexonu'),)
         indexes = [
             models.Index(fields=['snmpindexonu']),
+            # Los pollers y el descubrimiento filtran siempre por host
+            models.Index(fields=['host', 'snmpindexonu'], name='onu_datos_host_indice_idx'),
+            models.Index(fields=['host', 'modelo_onu'], name='onu_datos_host_modelo_idx'),
+            models.Index(fields=['distancia_metros'], name='onu_datos_distancia_idx'),
+            models.Index(fields=['potencia_rx_dbm'], name='onu_datos_potencia_rx_idx'),
         ]
 
     def __str__(self):
@@ -159,6 +186,104 @@ class EjecucionTareaSNMP(models.Model):
         ordering = ['-inicio']
         verbose_name = "Ejecución de Tarea"
         verbose_name_plural = "Ejecuciones de Tareas"
+        indexes = [
+            # Última ejecución por tarea (supervisor, admin)
+            models.Index(fields=['tarea', '-inicio'], name='ejec_tarea_inicio_idx'),
+            # Ejecuciones en curso (control de solapes del scheduler)
+            models.Index(
+                fields=['tarea'],
+                condition=models.Q(estado='E'),
+                name='ejec_en_curso_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.tarea.nombre} - {self.get_estado_display()} ({self.inicio:%Y-%m-%d %H:%M:%S})"
+
+
+class EstadoTareaSNMP(models.Model):
+    """
+    Resumen del estado de cada tarea, mantenido al abrir y cerrar sus
+    ejecuciones (tasks/estado_tarea.py). El supervisor, el admin y el
+    scheduler leen esta tabla en lugar del historial de ejecuciones.
+    """
+    tarea           = models.OneToOneField(
+        TareaSNMP, on_delete=models.CASCADE, primary_key=True, related_name='estado'
+    )
+    ultimo_inicio   = models.DateTimeField(null=True, blank=True, verbose_name="Último inicio")
+    ultimo_fin      = models.DateTimeField(null=True, blank=True, verbose_name="Último fin")
+    ultimo_estado   = models.CharField(
+        max_length=1, choices=EjecucionTareaSNMP.ESTADOS, blank=True, verbose_name="Último estado"
+    )
+    ultima_duracion = models.DurationField(null=True, blank=True, verbose_name="Última duración")
+    tasa_exito      = models.FloatField(default=0, verbose_name="Tasa de éxito (media móvil)")
+    cerradas        = models.PositiveIntegerField(default=0, verbose_name="Ejecuciones terminadas")
+    en_curso        = models.PositiveIntegerField(default=0, verbose_name="Ejecuciones en curso")
+    actualizado     = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Estado de tarea"
+        verbose_name_plural = "Estados de tareas"
+
+    def __str__(self):
+        return f"{self.tarea_id}: {self.ultimo_estado or '-'} ({self.en_curso} en curso)"
+
+
+class PerfilRendimientoOLT(models.Model):
+    """
+    Rendimiento SNMP medido por OLT (medias móviles), usado por poller_master
+    para dimensionar los chunks y PDUs de cada host.
+    """
+    host_ip             = models.GenericIPAddressField(protocol='IPv4', unique=True, verbose_name="IP del OLT")
+    latencia_varbind_ms = models.FloatField(default=0, verbose_name="Latencia media por varbind (ms)")
+    tasa_timeouts       = models.FloatField(default=0, verbose_name="Tasa de timeouts")
+    muestras            = models.PositiveIntegerField(default=0)
+    actualizado         = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Perfil de rendimiento OLT"
+        verbose_name_plural = "Perfiles de rendimiento OLT"
+
+    def __str__(self):
+        return f"{self.host_ip} ({self.latencia_varbind_ms:.1f} ms/varbind)"
+
+
+class OnuMetrica(models.Model):
+    """
+    Histórico de métricas por ONU (tabla 'onu_metricas', particionada por
+    día), con una fila por ONU y hora. La escribe el poller en cada ciclo
+    junto con la actualización de onu_datos.
+    """
+    id          = models.BigAutoField(primary_key=True)
+    tiempo      = models.DateTimeField()
+    onu_id      = models.IntegerField()
+    potencia_rx = models.FloatField(null=True, blank=True)
+    potencia_tx = models.FloatField(null=True, blank=True)
+    estado      = models.SmallIntegerField(null=True, blank=True)
+    distancia_m = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        managed = False  # Tabla particionada creada por SQL (migración 0004)
+        db_table = 'onu_metricas'
+        verbose_name = 'Métrica ONU'
+        verbose_name_plural = 'Métricas ONU'
+
+
+class OnuMetricaDiaria(models.Model):
+    """Resumen diario de onu_metricas, conservado tras purgar el detalle."""
+    id              = models.BigAutoField(primary_key=True)
+    fecha           = models.DateField()
+    onu_id          = models.IntegerField()
+    potencia_rx_min = models.FloatField(null=True, blank=True)
+    potencia_rx_avg = models.FloatField(null=True, blank=True)
+    potencia_rx_max = models.FloatField(null=True, blank=True)
+    potencia_tx_avg = models.FloatField(null=True, blank=True)
+    distancia_m_avg = models.IntegerField(null=True, blank=True)
+    muestras        = models.IntegerField()  # lecturas de estado del día
+    muestras_online = models.IntegerField()  # de ellas, con estado online (1)
+
+    class Meta:
+        managed = False
+        db_table = 'onu_metricas_diarias'
+        verbose_name = 'Métrica diaria ONU'
+        verbose_name_plural = 'Métricas diarias ONU'
@@ -0,0 +1,99 @@
+# snmp_scheduler/tasks/carga_chunk.py
+
+"""
+Formato compacto de los mensajes de chord de poller_worker.
+
+Chunk: las filas [id, snmpindexonu, huella] se ordenan y se agrupan en
+tramos contiguos (mismo puerto PON, onu lógico e id consecutivos). Cada
+tramo se empaqueta como (ifindex, onu_inicio, id_inicio, cantidad) seguido
+de las huellas, y el binario va comprimido en base64 dentro del JSON.
+
+Resultado: los workers ya borran e informan sus ONUs, así que al
+aggregator solo viajan contadores y una muestra de errores.
+"""
+
+import base64
+import struct
+import zlib
+from django.conf import settings
+
+_TRAMO = struct.Struct('<IHQH')
+_HUELLA = struct.Struct('<I')
+_MAX_TRAMO = 0xFFFF
+# Huella de un valor NULL en onu_datos. Un texto cuyo CRC32 coincida se lee
+# como NULL y solo cuesta una escritura redundante, nunca un cambio perdido
+_SIN_HUELLA = 0xFFFFFFFF
+
+
+def _partir_indice(idx):
+    ifindex, onu = idx.split('.')
+    return int(ifindex), int(onu)
+
+
+def empaquetar_chunk(filas):
+    """
+    [[id, 'ifindex.onu', huella], ...] -> str base64. Si algún índice no
+    tiene la forma numérica esperada se devuelven las filas tal cual.
+    """
+    try:
+        claves = sorted(
+            (*_partir_indice(idx), onu_id, _SIN_HUELLA if h is None else h)
+            for onu_id, idx, h in filas
+        )
+    except (ValueError, TypeError):
+        return filas
+
+    partes = []
+    tramo = None
+    huellas = []
+
+    def cerrar():
+        if tramo:
+            partes.append(_TRAMO.pack(*tramo, len(huellas)))
+            partes.extend(_HUELLA.pack(h) for h in huellas)
+
+    for ifindex, onu, onu_id, h in claves:
+        if (tramo and ifindex == tramo[0] and len(huellas) < _MAX_TRAMO
+                and onu == tramo[1] + len(huellas) and onu_id == tramo[2] + len(huellas)):
+            huellas.append(h)
+            continue
+        cerrar()
+        tramo = (ifindex, onu, onu_id)
+        huellas = [h]
+    cerrar()
+
+    return base64.b64encode(zlib.compress(b''.join(partes))).decode('ascii')
+
+
+def desempaquetar_chunk(carga):
+    """Inverso de empaquetar_chunk; las listas se devuelven sin cambios."""
+    if not isinstance(carga, str):
+        return carga
+
+    datos = zlib.decompress(base64.b64decode(carga))
+    filas = []
+    pos = 0
+    while pos < len(datos):
+        ifindex, onu, onu_id, cantidad = _TRAMO.unpack_from(datos, pos)
+        pos += _TRAMO.size
+        for i in range(cantidad):
+            h, = _HUELLA.unpack_from(datos, pos)
+            pos += _HUELLA.size
+            filas.append([onu_id + i, f"{ifindex}.{onu + i}", None if h == _SIN_HUELLA else h])
+    return filas
+
+
+def resumir_resultado(resultado):
+    """
+    Reduce el dict de un worker a contadores y una muestra de errores
+    (SNMP_RESULTADO_MAX_ERRORES) antes de guardarlo en el result backend.
+    """
+    max_errores = getattr(settings, 'SNMP_RESULTADO_MAX_ERRORES', 20)
+    errores = resultado.get('errors', [])
+    return {
+        'updated': resultado.get('updated', 0),
+        'unchanged': resultado.get('unchanged', 0),
+        'deleted': resultado.get('deleted', 0),
+        'total_errores': resultado.get('total_errores', len(errores)),
+        'errors': errores[:max_errores],
+    }
@@ -13,10 +13,109 @@ from pysnmp.hlapi import (
     bulkCmd
 )
 
-NMP_ENGINE = SnmpEngine()
+import os
+import threading
+import time
+from django.conf import settings
+from easysnmp import Session, EasySNMPError
+
+# Recursos SNMP por proceso worker: se crean al primer uso en cada hijo
+# de Celery (nunca en el proceso padre antes del fork)
+SNMP_ENGINE = None
+_PID = None
+_SESIONES = {}
+_REDIS = None
+_LOCK = threading.Lock()
+
+
+def _reiniciar_si_fork():
+    global SNMP_ENGINE, _PID, _REDIS
+    if _PID != os.getpid():
+        SNMP_ENGINE = None
+        _SESIONES.clear()
+        _REDIS = None
+        _PID = os.getpid()
+
 
 def get_snmp_engine():
-    return SNMP_ENGINE
+    """SnmpEngine (pysnmp síncrono) compartido por el proceso."""
+    global SNMP_ENGINE
+    with _LOCK:
+        _reiniciar_si_fork()
+        if SNMP_ENGINE is None:
+            SNMP_ENGINE = SnmpEngine()
+        return SNMP_ENGINE
+
+
+def _sesion_viva(session):
+    """Health check barato: un GET de sysUpTime."""
+    try:
+        session.get('1.3.6.1.2.1.1.3.0')
+        return True
+    except EasySNMPError:
+        return False
+
+
+def obtener_sesion(host_ip, comunidad, version=2, timeout=6, retries=1):
+    """
+    Sesión easysnmp reutilizable por (host_ip, comunidad, version) dentro del
+    proceso worker. Expulsa las sesiones inactivas más de
+    SNMP_SESION_INACTIVA_SEG y verifica con sysUpTime las que llevan más de
+    SNMP_SESION_VERIFICAR_SEG sin usarse antes de devolverlas.
+    """
+    inactiva_max = getattr(settings, 'SNMP_SESION_INACTIVA_SEG', 300)
+    verificar = getattr(settings, 'SNMP_SESION_VERIFICAR_SEG', 60)
+    clave = (host_ip, comunidad, version)
+    ahora = time.monotonic()
+
+    with _LOCK:
+        _reiniciar_si_fork()
+        for k, (_, uso) in list(_SESIONES.items()):
+            if ahora - uso > inactiva_max:
+                del _SESIONES[k]
+        entrada = _SESIONES.get(clave)
+
+    session = None
+    if entrada:
+        session, uso = entrada
+        if ahora - uso > verificar and not _sesion_viva(session):
+            logger.info(f"[sesiones] Sesión {host_ip} no responde, se recrea")
+            session = None
+
+    if session is None:
+        session = Session(
+            hostname=host_ip,
+            community=comunidad,
+            version=version,
+            timeout=timeout,
+            retries=retries,
+            use_numeric=True
+        )
+
+    with _LOCK:
+        _SESIONES[clave] = (session, ahora)
+    return session
+
+
+def descartar_sesion(host_ip, comunidad, version=2):
+    """Quita la sesión del pool (p.ej. tras un timeout) para que se recree."""
+    with _LOCK:
+        _SESIONES.pop((host_ip, comunidad, version), None)
+
+
+def obtener_redis():
+    """
+    Cliente Redis del proceso (por defecto el mismo servidor que el broker
+    de Celery), usado para coordinar la carga SNMP entre workers.
+    """
+    global _REDIS
+    with _LOCK:
+        _reiniciar_si_fork()
+        if _REDIS is None:
+            import redis
+            url = getattr(settings, 'SNMP_LIMITE_REDIS_URL', None) or settings.CELERY_BROKER_URL
+            _REDIS = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        return _REDIS
 
 from django.utils import timezone
 from datetime import timedelta
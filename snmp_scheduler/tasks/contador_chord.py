@@ -0,0 +1,116 @@
+# snmp_scheduler/tasks/contador_chord.py
+
+"""
+Unión de chunks de poller_worker sin result backend.
+
+En modo SNMP_POLLER_RESULTADOS = 'contador' poller_master lanza los chunks
+como tareas sueltas (sin guardar su resultado) y cada worker suma sus
+contadores en un hash de Redis por ejecución. El último chunk en terminar
+encola poller_aggregator con el total ya acumulado: ni una fila de
+django_celery_results por chunk ni el polling del chord sobre Postgres.
+"""
+
+import json
+from django.conf import settings
+from .common import logger, obtener_redis
+
+# KEYS: [hash, lista_errores]
+# ARGV: [updated, unchanged, deleted, total_errores, max_errores, errores_json...]
+# Devuelve 0 mientras queden chunks, -1 si el contador no existe (caducado)
+# y al último chunk [hash_plano, errores].
+_ACUMULAR = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+redis.call('HINCRBY', KEYS[1], 'updated', ARGV[1])
+redis.call('HINCRBY', KEYS[1], 'unchanged', ARGV[2])
+redis.call('HINCRBY', KEYS[1], 'deleted', ARGV[3])
+redis.call('HINCRBY', KEYS[1], 'total_errores', ARGV[4])
+for i = 6, #ARGV do
+    redis.call('RPUSH', KEYS[2], ARGV[i])
+end
+redis.call('LTRIM', KEYS[2], 0, tonumber(ARGV[5]) - 1)
+if redis.call('HINCRBY', KEYS[1], 'pendientes', -1) > 0 then
+    return 0
+end
+local total = redis.call('HGETALL', KEYS[1])
+local errores = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('DEL', KEYS[1], KEYS[2])
+return {total, errores}
+"""
+
+_SCRIPT = None
+
+
+def _script():
+    global _SCRIPT
+    cliente = obtener_redis()
+    if _SCRIPT is None or _SCRIPT.registered_client is not cliente:
+        _SCRIPT = cliente.register_script(_ACUMULAR)
+    return _SCRIPT
+
+
+def _claves(ejecucion_id):
+    return [f"snmp:chord:{ejecucion_id}", f"snmp:chord:{ejecucion_id}:errores"]
+
+
+def iniciar_contador(ejecucion_id, chunks):
+    """
+    Registra cuántos chunks tiene la ejecución. Devuelve False si Redis no
+    está disponible, para que poller_master use un chord normal.
+    """
+    ttl = getattr(settings, 'SNMP_CONTADOR_TTL_SEG', 3600)
+    try:
+        clave, errores = _claves(ejecucion_id)
+        pipe = obtener_redis().pipeline()
+        pipe.delete(errores)
+        pipe.hset(clave, 'pendientes', chunks)
+        pipe.expire(clave, ttl)
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"[contador] Redis no disponible ({e}); ejecución {ejecucion_id} usará chord")
+        return False
+
+
+def acumular_resultado(tarea_id, ejecucion_id, resultado):
+    """
+    Suma el resultado (ya resumido) de un chunk. Si era el último chunk
+    pendiente encola poller_aggregator con el total.
+    """
+    from .poller_aggregator import poller_aggregator
+
+    ttl = getattr(settings, 'SNMP_CONTADOR_TTL_SEG', 3600)
+    max_errores = getattr(settings, 'SNMP_RESULTADO_MAX_ERRORES', 20)
+    errores = resultado.get('errors', [])
+    try:
+        cliente = obtener_redis()
+        final = _script()(
+            keys=_claves(ejecucion_id),
+            args=[
+                resultado.get('updated', 0),
+                resultado.get('unchanged', 0),
+                resultado.get('deleted', 0),
+                resultado.get('total_errores', len(errores)),
+                max_errores,
+                *[json.dumps(e) for e in errores],
+            ]
+        )
+        if final == -1:
+            logger.error(f"[contador] Contador de la ejecución {ejecucion_id} inexistente o caducado")
+            return
+        if final == 0:
+            cliente.expire(_claves(ejecucion_id)[1], ttl)
+            return
+    except Exception as e:
+        logger.error(f"[contador] No se pudo acumular el chunk de la ejecución {ejecucion_id}: {e}")
+        return
+
+    plano, lista = final
+    total = {
+        k.decode(): int(v)
+        for k, v in zip(plano[::2], plano[1::2])
+        if k.decode() != 'pendientes'
+    }
+    total['errors'] = [json.loads(e) for e in lista]
+    poller_aggregator.delay([total], tarea_id, ejecucion_id)
@@ -9,8 +9,7 @@ logger = get_logger(__name__)
 
 @shared_task(
     bind=True,
-    name='snmp_scheduler.tasks.delete_history_records',
-    queue='background_deletes'
+    name='snmp_scheduler.tasks.delete_history_records'
 )
 def delete_history_records(self, record_ids):
     """
@@ -0,0 +1,135 @@
+# snmp_scheduler/tasks/estado_tarea.py
+
+"""
+Mantenimiento de EstadoTareaSNMP, el resumen por tarea de sus ejecuciones.
+
+Todas las ejecuciones se abren con abrir_ejecucion y se cierran con
+cerrar_ejecucion / cerrar_ejecuciones: el registro de la ejecución y el
+resumen de la tarea se escriben en la misma transacción, y el resumen con
+un único UPDATE de expresiones F (sin leer y reescribir la fila).
+
+Cada ejecución la cierra una sola tarea (en bulk, poller_aggregator). Aun
+así solo el primer cierre (desde 'E') descuenta en_curso y cuenta para la
+tasa de éxito: un cierre repetido (reentrega de Celery, limpieza de
+ejecuciones abandonadas) solo refresca el último estado y la duración.
+
+en_curso es un contador: si una ejecución se borra o nunca se cierra (chord
+perdido, caída del broker) se desvía, y conciliar_en_curso lo recalcula a
+partir de las ejecuciones 'E' antes de que el scheduler o el supervisor lo
+usen.
+"""
+
+from django.db import transaction
+from django.db.models import Case, When, Value, F, FloatField, Count
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from ..models import EjecucionTareaSNMP, EstadoTareaSNMP
+
+# Peso de la última ejecución en la tasa de éxito (≈ últimas 10 ejecuciones)
+ALFA = 0.1
+
+
+def abrir_ejecucion(tarea_id):
+    """Crea la EjecucionTareaSNMP en curso y la suma al estado de la tarea."""
+    with transaction.atomic():
+        ejec = EjecucionTareaSNMP.objects.create(tarea_id=tarea_id, estado='E')
+        EstadoTareaSNMP.objects.get_or_create(tarea_id=tarea_id)
+        EstadoTareaSNMP.objects.filter(tarea_id=tarea_id).update(
+            ultimo_inicio=ejec.inicio,
+            ultimo_fin=None,
+            ultimo_estado='E',
+            ultima_duracion=None,
+            en_curso=F('en_curso') + 1,
+            actualizado=ejec.inicio
+        )
+    return ejec
+
+
+def _registrar_cierre(tarea_id, inicio, fin, estado, primer_cierre):
+    """Un UPDATE del resumen de la tarea por una ejecución cerrada."""
+    def si_es_la_ultima(valor, output_field):
+        # Una ejecución más antigua que la última iniciada no cambia el "último"
+        return Case(
+            When(ultimo_inicio__gt=inicio, then=F(output_field.name)),
+            default=Value(valor),
+            output_field=output_field
+        )
+
+    campos = EstadoTareaSNMP._meta
+    cambios = {
+        'ultimo_inicio': si_es_la_ultima(inicio, campos.get_field('ultimo_inicio')),
+        'ultimo_fin': si_es_la_ultima(fin, campos.get_field('ultimo_fin')),
+        'ultimo_estado': si_es_la_ultima(estado, campos.get_field('ultimo_estado')),
+        'ultima_duracion': si_es_la_ultima(fin - inicio, campos.get_field('ultima_duracion')),
+        'actualizado': fin,
+    }
+    if primer_cierre:
+        exito = 1.0 if estado == 'C' else 0.0
+        cambios.update(
+            en_curso=Greatest(F('en_curso') - 1, Value(0)),
+            tasa_exito=Case(
+                When(cerradas=0, then=Value(exito)),
+                default=ALFA * exito + (1 - ALFA) * F('tasa_exito'),
+                output_field=FloatField()
+            ),
+            cerradas=F('cerradas') + 1,
+        )
+
+    EstadoTareaSNMP.objects.get_or_create(tarea_id=tarea_id)
+    EstadoTareaSNMP.objects.filter(tarea_id=tarea_id).update(**cambios)
+
+
+def cerrar_ejecucion(ejec, estado):
+    """
+    Termina la ejecución con estado 'C' o 'F' (guardando también el error y
+    resultado que ya tenga asignados) y actualiza el estado de la tarea.
+    """
+    with transaction.atomic():
+        previo = (
+            EjecucionTareaSNMP.objects
+                              .select_for_update()
+                              .filter(pk=ejec.pk)
+                              .values_list('estado', flat=True)
+                              .first()
+        )
+        ejec.fin = timezone.now()
+        ejec.estado = estado
+        ejec.save()
+        # previo != 'E': la ejecución ya estaba cerrada (cierre repetido)
+        _registrar_cierre(ejec.tarea_id, ejec.inicio, ejec.fin, estado, previo == 'E')
+
+
+def cerrar_ejecuciones(queryset, estado, **campos):
+    """cerrar_ejecucion para un queryset de ejecuciones (con un UPDATE)."""
+    fin = timezone.now()
+    with transaction.atomic():
+        filas = list(queryset.select_for_update().values_list('pk', 'tarea_id', 'inicio', 'estado'))
+        EjecucionTareaSNMP.objects.filter(pk__in=[f[0] for f in filas]).update(
+            estado=estado, fin=fin, **campos
+        )
+        for _, tarea_id, inicio, previo in filas:
+            _registrar_cierre(tarea_id, inicio, fin, estado, previo == 'E')
+    return len(filas)
+
+
+def conciliar_en_curso(estados):
+    """
+    Recalcula en_curso de los EstadoTareaSNMP dados con sus ejecuciones 'E'
+    (una consulta, por ejec_en_curso_idx). Corrige la fila con la diferencia
+    (F, sin pisar una apertura concurrente) y el propio objeto.
+    """
+    if not estados:
+        return
+    abiertas = dict(
+        EjecucionTareaSNMP.objects
+                          .filter(tarea_id__in=[e.tarea_id for e in estados], estado='E')
+                          .values_list('tarea_id')
+                          .annotate(n=Count('pk'))
+    )
+    for estado in estados:
+        real = abiertas.get(estado.tarea_id, 0)
+        if estado.en_curso != real:
+            EstadoTareaSNMP.objects.filter(tarea_id=estado.tarea_id).update(
+                en_curso=Greatest(F('en_curso') + (real - estado.en_curso), Value(0))
+            )
+            estado.en_curso = real
@@ -0,0 +1,155 @@
+# snmp_scheduler/tasks/limitador_olt.py
+
+"""
+Limitador de carga SNMP por OLT, compartido por todos los workers vía Redis.
+
+Antes de cada PDU el worker pide turno para el host_ip: como máximo
+SNMP_LIMITE_EN_VUELO peticiones simultáneas por OLT (semáforo con
+caducidad, por si un worker muere con el turno tomado) y un cubo de
+tokens de SNMP_LIMITE_VARBINDS_SEG varbinds por segundo.
+
+Si Redis no responde o la espera supera SNMP_LIMITE_ESPERA_SEG se sigue
+sin limitar: el limitador nunca detiene el sondeo.
+"""
+
+import asyncio
+import time
+import uuid
+from contextlib import contextmanager, asynccontextmanager
+from django.conf import settings
+from .common import logger, obtener_redis
+
+# KEYS: [en_vuelo, cubo]
+# ARGV: [turno, max_en_vuelo, ttl_turno, tasa, capacidad, varbinds]
+# Devuelve 1 si se concede el turno, 0 si hay que esperar.
+_ADQUIRIR = """
+local t = redis.call('TIME')
+local ahora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local max_vuelo = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+local tasa = tonumber(ARGV[4])
+local capacidad = tonumber(ARGV[5])
+local pedidos = math.min(tonumber(ARGV[6]), capacidad)
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ahora)
+if redis.call('ZCARD', KEYS[1]) >= max_vuelo then
+    return 0
+end
+
+local cubo = redis.call('HMGET', KEYS[2], 'tokens', 'ts')
+local tokens = tonumber(cubo[1]) or capacidad
+local ts = tonumber(cubo[2]) or ahora
+tokens = math.min(capacidad, tokens + (ahora - ts) * tasa)
+local concedido = tokens >= pedidos
+if concedido then
+    tokens = tokens - pedidos
+end
+redis.call('HSET', KEYS[2], 'tokens', tokens, 'ts', ahora)
+redis.call('EXPIRE', KEYS[2], 60)
+if not concedido then
+    return 0
+end
+
+redis.call('ZADD', KEYS[1], ahora + ttl, ARGV[1])
+redis.call('EXPIRE', KEYS[1], ttl + 1)
+return 1
+"""
+
+_SCRIPT = None
+
+
+def _script():
+    global _SCRIPT
+    cliente = obtener_redis()
+    # Tras un fork obtener_redis devuelve un cliente nuevo
+    if _SCRIPT is None or _SCRIPT.registered_client is not cliente:
+        _SCRIPT = cliente.register_script(_ADQUIRIR)
+    return _SCRIPT
+
+
+def _claves(host_ip):
+    return [f"snmp:olt:{host_ip}:en_vuelo", f"snmp:olt:{host_ip}:cubo"]
+
+
+def _intentar(host_ip, turno, varbinds):
+    """
+    Un intento de tomar turno. Devuelve True/False, o None si Redis no
+    está disponible (en cuyo caso no se limita).
+    """
+    tasa = getattr(settings, 'SNMP_LIMITE_VARBINDS_SEG', 500)
+    try:
+        return bool(_script()(
+            keys=_claves(host_ip),
+            args=[
+                turno,
+                getattr(settings, 'SNMP_LIMITE_EN_VUELO', 4),
+                getattr(settings, 'SNMP_LIMITE_TTL_SEG', 30),
+                tasa,
+                getattr(settings, 'SNMP_LIMITE_RAFAGA', tasa),
+                varbinds,
+            ]
+        ))
+    except Exception as e:
+        logger.warning(f"[limitador] Redis no disponible ({e}); se continúa sin limitar {host_ip}")
+        return None
+
+
+def _liberar(host_ip, turno):
+    try:
+        obtener_redis().zrem(_claves(host_ip)[0], turno)
+    except Exception:
+        pass  # El turno caduca solo
+
+
+@contextmanager
+def turno_olt(host_ip, varbinds=1):
+    """
+    Bloquea hasta que la OLT admite una petición de `varbinds` varbinds y
+    mantiene el turno ocupado mientras dura el bloque `with`.
+    """
+    if not getattr(settings, 'SNMP_LIMITE_ACTIVO', True):
+        yield
+        return
+
+    turno = uuid.uuid4().hex
+    espera_max = getattr(settings, 'SNMP_LIMITE_ESPERA_SEG', 30)
+    limite = time.monotonic() + espera_max
+    concedido = _intentar(host_ip, turno, varbinds)
+    while concedido is False and time.monotonic() < limite:
+        time.sleep(0.05)
+        concedido = _intentar(host_ip, turno, varbinds)
+
+    if concedido is False:
+        logger.warning(f"[limitador] {host_ip}: sin turno tras {espera_max}s, se envía igualmente")
+    try:
+        yield
+    finally:
+        if concedido:
+            _liberar(host_ip, turno)
+
+
+@asynccontextmanager
+async def turno_olt_async(host_ip, varbinds=1):
+    """Versión para corrutinas de turno_olt: espera sin bloquear el bucle."""
+    if not getattr(settings, 'SNMP_LIMITE_ACTIVO', True):
+        yield
+        return
+
+    # El cliente Redis es síncrono: cada intento va a un hilo para no
+    # bloquear el bucle de eventos si Redis tarda en responder
+    bucle = asyncio.get_running_loop()
+    turno = uuid.uuid4().hex
+    espera_max = getattr(settings, 'SNMP_LIMITE_ESPERA_SEG', 30)
+    limite = time.monotonic() + espera_max
+    concedido = await bucle.run_in_executor(None, _intentar, host_ip, turno, varbinds)
+    while concedido is False and time.monotonic() < limite:
+        await asyncio.sleep(0.05)
+        concedido = await bucle.run_in_executor(None, _intentar, host_ip, turno, varbinds)
+
+    if concedido is False:
+        logger.warning(f"[limitador] {host_ip}: sin turno tras {espera_max}s, se envía igualmente")
+    try:
+        yield
+    finally:
+        if concedido:
+            await bucle.run_in_executor(None, _liberar, host_ip, turno)
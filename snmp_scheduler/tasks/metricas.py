@@ -0,0 +1,193 @@
+# snmp_scheduler/tasks/metricas.py
+
+"""
+Histórico de métricas por ONU (onu_metricas).
+
+Los pollers llaman a registrar_metricas con todos los valores leídos en el
+ciclo (no solo los que cambiaron). Cada ONU tiene una fila por hora (el
+periodo de las tareas): cada columna sondeada la completa con un upsert en
+lugar de añadir su propia fila dispersa. La
+tarea diaria mantener_metricas crea las particiones de los próximos días,
+resume cada día en onu_metricas_diarias y borra las particiones de más de
+SNMP_METRICAS_RETENCION_DIAS con DROP TABLE (sin DELETE ni VACUUM). Solo
+la partición DEFAULT, que recoge lo que llega fuera de las particiones
+diarias, se purga con DELETE.
+"""
+
+from datetime import datetime, time, timedelta
+from celery import shared_task
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from psycopg2.extras import execute_values
+from .common import logger
+from .normalizacion import fila_metrica
+
+COLUMNAS = ('potencia_rx', 'potencia_tx', 'estado', 'distancia_m')
+
+
+def registrar_metricas(filas, tiempo=None):
+    """
+    Registra la muestra de la hora de cada ONU a partir de
+    {onu_id: {campo: valor}}: inserta la fila (onu, hora) o completa la
+    existente con las columnas leídas, sin borrar las de otras tareas.
+    Nunca interrumpe al poller: los errores solo se registran.
+    """
+    if not getattr(settings, 'SNMP_METRICAS_ACTIVAS', True) or not filas:
+        return 0
+
+    hora = (tiempo or timezone.now()).replace(minute=0, second=0, microsecond=0)
+    valores = []
+    # En orden de ONU: los workers de distintas columnas de un host bloquean
+    # las mismas filas siempre en el mismo orden (sin interbloqueos)
+    for onu_id, campos in sorted(filas.items()):
+        fila = fila_metrica(campos)
+        if fila:
+            valores.append((hora, onu_id, *[fila.get(c) for c in COLUMNAS]))
+    if not valores:
+        return 0
+
+    actualizar = ', '.join(f"{c} = COALESCE(EXCLUDED.{c}, onu_metricas.{c})" for c in COLUMNAS)
+    try:
+        with connection.cursor() as cursor:
+            execute_values(
+                cursor.cursor,
+                f"""
+                INSERT INTO onu_metricas (tiempo, onu_id, {', '.join(COLUMNAS)}) VALUES %s
+                ON CONFLICT (onu_id, tiempo) DO UPDATE SET {actualizar}
+                """,
+                valores,
+                page_size=getattr(settings, 'SNMP_UPDATE_LOTE', 1000)
+            )
+    except Exception as e:
+        logger.warning(f"[metricas] No se pudieron registrar {len(valores)} muestras: {e}")
+        return 0
+    return len(valores)
+
+
+def _particion(dia):
+    return f"onu_metricas_{dia:%Y%m%d}"
+
+
+def _medianoche(dia):
+    """
+    Medianoche local (TIME_ZONE) del día como datetime aware: la sesión de
+    Postgres está en UTC y una fecha sin zona se interpretaría a las 00:00 UTC.
+    """
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _crear_particion(cursor, dia):
+    """
+    Crea la partición del día. Las filas de ese día que ya hayan caído en la
+    partición DEFAULT (p.ej. antes del primer mantenimiento) se mueven a la
+    nueva antes de adjuntarla; si no, Postgres rechaza la partición.
+    """
+    nombre = _particion(dia)
+    desde, hasta = _medianoche(dia), _medianoche(dia + timedelta(days=1))
+    cursor.execute("SELECT to_regclass(%s)", [nombre])
+    if cursor.fetchone()[0]:
+        return
+
+    with transaction.atomic():
+        # Sin inserciones en DEFAULT mientras se mueven sus filas
+        cursor.execute("LOCK TABLE onu_metricas_default IN EXCLUSIVE MODE")
+        cursor.execute(f"CREATE TABLE {nombre} (LIKE onu_metricas INCLUDING DEFAULTS)")
+        cursor.execute(f"""
+            WITH movidas AS (
+                DELETE FROM onu_metricas_default
+                WHERE tiempo >= %s AND tiempo < %s
+                RETURNING *
+            )
+            INSERT INTO {nombre} SELECT * FROM movidas
+        """, [desde, hasta])
+        cursor.execute(f"""
+            ALTER TABLE onu_metricas ATTACH PARTITION {nombre}
+            FOR VALUES FROM (%s) TO (%s)
+        """, [desde, hasta])
+
+
+def _resumir_dia(cursor, dia):
+    """
+    Resume (o vuelve a resumir) un día de onu_metricas en onu_metricas_diarias.
+    En los modos por columna cada tarea inserta su propia fila con solo su
+    campo, así que muestras cuenta las lecturas de estado (el denominador de
+    muestras_online), no las filas.
+    """
+    cursor.execute("""
+        INSERT INTO onu_metricas_diarias (
+            fecha, onu_id, potencia_rx_min, potencia_rx_avg, potencia_rx_max,
+            potencia_tx_avg, distancia_m_avg, muestras, muestras_online
+        )
+        SELECT %s, onu_id, MIN(potencia_rx), AVG(potencia_rx), MAX(potencia_rx),
+               AVG(potencia_tx), AVG(distancia_m)::integer, COUNT(estado),
+               COUNT(*) FILTER (WHERE estado = 1)
+        FROM onu_metricas
+        WHERE tiempo >= %s AND tiempo < %s
+        GROUP BY onu_id
+        ON CONFLICT (onu_id, fecha) DO UPDATE SET
+            potencia_rx_min = EXCLUDED.potencia_rx_min,
+            potencia_rx_avg = EXCLUDED.potencia_rx_avg,
+            potencia_rx_max = EXCLUDED.potencia_rx_max,
+            potencia_tx_avg = EXCLUDED.potencia_tx_avg,
+            distancia_m_avg = EXCLUDED.distancia_m_avg,
+            muestras        = EXCLUDED.muestras,
+            muestras_online = EXCLUDED.muestras_online
+    """, [dia, _medianoche(dia), _medianoche(dia + timedelta(days=1))])
+
+
+@shared_task(
+    bind=True,
+    name='snmp_scheduler.tasks.mantener_metricas',
+    soft_time_limit=1800
+)
+def mantener_metricas(self):
+    """
+    Mantenimiento diario del histórico:
+    1) particiones para hoy y los próximos SNMP_METRICAS_DIAS_ADELANTE días
+    2) resumen diario de ayer
+    3) DROP de las particiones más antiguas que la retención (ya resumidas)
+       y purga de esos días en la partición DEFAULT
+    4) purga de resúmenes más antiguos que SNMP_METRICAS_DIARIAS_RETENCION_DIAS
+    """
+    hoy = timezone.localdate()
+    adelante = getattr(settings, 'SNMP_METRICAS_DIAS_ADELANTE', 3)
+    retencion = getattr(settings, 'SNMP_METRICAS_RETENCION_DIAS', 30)
+    retencion_diaria = getattr(settings, 'SNMP_METRICAS_DIARIAS_RETENCION_DIAS', 730)
+    limite = hoy - timedelta(days=retencion)
+
+    with connection.cursor() as cursor:
+        for i in range(adelante + 1):
+            try:
+                _crear_particion(cursor, hoy + timedelta(days=i))
+            except Exception as e:
+                # p.ej. se solapa con una partición existente
+                logger.error(f"[metricas] No se pudo crear la partición de {hoy + timedelta(days=i)}: {e}")
+
+        _resumir_dia(cursor, hoy - timedelta(days=1))
+
+        cursor.execute("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = 'onu_metricas' AND c.relname ~ '^onu_metricas_[0-9]{8}$'
+        """)
+        borradas = []
+        for nombre, in cursor.fetchall():
+            dia = datetime.strptime(nombre[-8:], '%Y%m%d').date()
+            if dia < limite:
+                _resumir_dia(cursor, dia)
+                cursor.execute(f"DROP TABLE {nombre}")
+                borradas.append(nombre)
+
+        # Lo que quedó en DEFAULT fuera de las particiones diarias (ya incluido
+        # en el resumen de su día)
+        cursor.execute("DELETE FROM onu_metricas_default WHERE tiempo < %s", [_medianoche(limite)])
+
+        cursor.execute(
+            "DELETE FROM onu_metricas_diarias WHERE fecha < %s",
+            [hoy - timedelta(days=retencion_diaria)]
+        )
+
+    logger.info(f"[metricas] Particiones hasta {hoy + timedelta(days=adelante)}, eliminadas: {borradas}")
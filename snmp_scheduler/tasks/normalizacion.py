@@ -0,0 +1,161 @@
+# snmp_scheduler/tasks/normalizacion.py
+
+"""
+Conversión de los valores SNMP (texto) de onu_datos a números.
+
+Las columnas de onu_datos guardan el texto tal como se muestra; aquí se
+interpreta una sola vez, al escribir, para las columnas tipadas de
+onu_datos (filtros por rango con índice) y para el histórico de métricas.
+"""
+
+import struct
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+# Valor que las OLT Huawei devuelven cuando la medida no está disponible
+HUAWEI_SIN_DATO = 2147483647
+
+# hwGponOntOpticalDdmOltRxOntPower (pot_rx) se informa en centésimas de dBm
+# más este desplazamiento: 7850 = (7850 - 10000) / 100 = -21.50 dBm
+HUAWEI_OLT_RX_DESPLAZAMIENTO = 10000
+
+
+def _numero(valor):
+    try:
+        return float(str(valor).strip().strip('"'))
+    except (TypeError, ValueError):
+        return None
+
+
+def a_dbm(valor):
+    """
+    Potencia óptica en dBm. Huawei la informa como entero en centésimas
+    (-2150 = -21.50, 85 = 0.85); solo un texto con punto decimal se toma
+    como ya expresado en dBm.
+    """
+    texto = str(valor or '').strip().strip('"')
+    v = _numero(texto)
+    if v is None or abs(v) >= HUAWEI_SIN_DATO:
+        return None
+    if '.' not in texto:
+        v = v / 100
+    return round(v, 2)
+
+
+def a_dbm_olt_rx(valor):
+    """
+    Potencia recibida en la OLT desde la ONU (pot_rx) en dBm: el entero
+    lleva el desplazamiento HUAWEI_OLT_RX_DESPLAZAMIENTO además de las
+    centésimas. Un texto con punto decimal se toma como ya en dBm.
+    """
+    texto = str(valor or '').strip().strip('"')
+    v = _numero(texto)
+    if v is None or abs(v) >= HUAWEI_SIN_DATO:
+        return None
+    if '.' not in texto:
+        v = (v - HUAWEI_OLT_RX_DESPLAZAMIENTO) / 100
+    return round(v, 2)
+
+
+def a_estado(valor):
+    """Estado de la ONU (1 online, 2 offline...) como entero."""
+    v = _numero(valor)
+    return int(v) if v is not None else None
+
+
+def a_metros(valor):
+    """
+    Distancia en metros desde el valor SNMP ("12345"), o desde el texto ya
+    formateado por normalizar_valor ("12.345 km"). -1 / "No Distancia" -> None.
+    """
+    texto = str(valor or '').strip().strip('"')
+    if texto.endswith('km'):
+        km = _numero(texto[:-2])
+        return int(round(km * 1000)) if km is not None else None
+    v = _numero(texto)
+    if v is None or v < 0:
+        return None
+    return int(v)
+
+
+def a_fecha(valor):
+    """
+    Fecha de un DateAndTime SNMP: texto "YYYY-MM-DD HH:MM:SS[+hh:mm]", los
+    octetos en hexadecimal ("07 E8 05 01 ...") o los octetos crudos.
+    """
+    texto = str(valor or '').strip().strip('"')
+    if not texto:
+        return None
+
+    for formato in ('%Y-%m-%d %H:%M:%S%z', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d,%H:%M:%S.%f,%z'):
+        try:
+            fecha = datetime.strptime(texto.replace('Z', '+0000'), formato)
+            return fecha if fecha.tzinfo else fecha.replace(tzinfo=dt_timezone.utc)
+        except ValueError:
+            continue
+
+    partes = texto.split()
+    if len(partes) in (8, 11) and all(len(p) <= 2 for p in partes):
+        try:
+            octetos = bytes(int(p, 16) for p in partes)
+        except ValueError:
+            return None
+    elif len(texto) in (8, 11):
+        octetos = texto.encode('latin-1', errors='ignore')
+    else:
+        return None
+
+    try:
+        anio, mes, dia, hora, minuto, segundo, _ = struct.unpack('>HBBBBBB', octetos[:8])
+        zona = dt_timezone.utc
+        if len(octetos) == 11:
+            signo = -1 if octetos[8:9] == b'-' else 1
+            zona = dt_timezone(signo * timedelta(hours=octetos[9], minutes=octetos[10]))
+        return datetime(anio, mes, dia, hora, minuto, segundo, tzinfo=zona)
+    except (struct.error, ValueError):
+        return None
+
+
+# Campo de texto de onu_datos -> (columna tipada de onu_datos, conversión)
+TIPADOS = {
+    'potencia_rx': ('potencia_rx_dbm', a_dbm_olt_rx),
+    'potencia_tx': ('potencia_tx_dbm', a_dbm),
+    'distancia_m': ('distancia_metros', a_metros),
+    'last_down_time': ('last_down_fecha', a_fecha),
+}
+
+
+def con_tipados(campos):
+    """
+    Añade a {campo: texto} las columnas tipadas derivadas. Un texto que no
+    se puede interpretar deja la columna tipada a NULL.
+    """
+    tipados = dict(campos)
+    for campo, valor in campos.items():
+        if campo in TIPADOS:
+            columna, convertir = TIPADOS[campo]
+            tipados[columna] = convertir(valor)
+    return tipados
+
+
+# Campo de onu_datos -> (columna de onu_metricas, conversión)
+METRICAS = {
+    'potencia_rx': ('potencia_rx', a_dbm_olt_rx),
+    'potencia_tx': ('potencia_tx', a_dbm),
+    'estado_onu': ('estado', a_estado),
+    'distancia_m': ('distancia_m', a_metros),
+}
+
+
+def fila_metrica(campos):
+    """
+    {campo_onu_datos: valor} -> {columna_metrica: número}, solo con los
+    campos que tienen histórico y un valor interpretable.
+    """
+    fila = {}
+    for campo, valor in campos.items():
+        if campo in METRICAS:
+            columna, convertir = METRICAS[campo]
+            numero = convertir(valor)
+            if numero is not None:
+                fila[columna] = numero
+    return fila
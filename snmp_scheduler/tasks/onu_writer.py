@@ -0,0 +1,174 @@
+# snmp_scheduler/tasks/onu_writer.py
+
+"""
+Escritura por lotes de los valores recolectados en onu_datos.
+
+En vez de un UPDATE + transacción por ONU se aplica todo el chunk con
+UPDATE ... FROM (VALUES ...) paginado; si el lote falla se reintenta
+fila a fila para aislar el registro problemático.
+"""
+
+import zlib
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from psycopg2.extras import execute_values
+from ..models import OnuDato
+from .common import logger
+from .normalizacion import con_tipados, TIPADOS
+
+
+# Columnas numéricas/fecha derivadas del texto
+COLUMNAS_TIPADAS = {columna for columna, _ in TIPADOS.values()}
+
+
+def _columna(campo):
+    return OnuDato._meta.get_field(campo).column
+
+
+def _tipo_sql(campo):
+    return OnuDato._meta.get_field(campo).db_type(connection)
+
+
+def _update_por_lotes(campos, filas, ahora):
+    """
+    Un UPDATE ... FROM (VALUES ...) para todas las filas que comparten
+    el mismo conjunto de campos. Devuelve los ids realmente actualizados.
+    """
+    columnas = [_columna(c) for c in campos]
+    # Cast explícito: en VALUES una columna solo con NULL se infiere como text
+    asignaciones = ', '.join(
+        f"{col} = v.{col}::{_tipo_sql(c)}" for c, col in zip(campos, columnas)
+    )
+    sql = f"""
+        UPDATE onu_datos AS o
+        SET {asignaciones}, fecha = v.fecha
+        FROM (VALUES %s) AS v(id, fecha, {', '.join(columnas)})
+        WHERE o.id = v.id
+        RETURNING o.id
+    """
+    valores = [
+        (onu_id, ahora, *[vals[c] for c in campos])
+        for onu_id, vals in filas
+    ]
+    lote = getattr(settings, 'SNMP_UPDATE_LOTE', 1000)
+    with connection.cursor() as cursor:
+        ids = execute_values(cursor.cursor, sql, valores, page_size=lote, fetch=True)
+    return ids
+
+
+def _update_fila_a_fila(filas, ahora):
+    """Camino de respaldo: un UPDATE por ONU, aislando los errores."""
+    updated = 0
+    errors = []
+    for onu_id, campos in filas:
+        try:
+            with transaction.atomic():
+                OnuDato.objects.filter(id=onu_id).update(**campos, fecha=ahora)
+                updated += 1
+        except Exception as e:
+            errors.append(f"Error BD: {str(e)}")
+            logger.error(f"Fallo actualizando {onu_id}: {str(e)}")
+            # Registramos "No identificado" para este ONU
+            try:
+                OnuDato.objects.filter(id=onu_id).update(
+                    **{
+                        campo: None if campo in COLUMNAS_TIPADAS else "No identificado"
+                        for campo in campos
+                    },
+                    fecha=ahora
+                )
+            except Exception:
+                pass
+    return updated, errors
+
+
+def filtrar_cambios(filas, actuales, clave=None):
+    """
+    Descarta los campos cuyo valor recolectado coincide con el guardado.
+    `actuales` es {onu_id: {campo: valor_en_bd}}, cargado en la misma
+    consulta que el mapeo de índices. Si se indica `clave` (p.ej. huella),
+    `actuales` guarda clave(valor_en_bd) y se compara con clave(nuevo).
+    Devuelve (filas_con_cambios, onus_sin_cambios).
+    """
+    cambiadas = {}
+    sin_cambio = 0
+    for onu_id, campos in filas.items():
+        previos = actuales.get(onu_id, {})
+        nuevos = {
+            campo: val for campo, val in campos.items()
+            if previos.get(campo) != (clave(val) if clave else val)
+        }
+        if nuevos:
+            cambiadas[onu_id] = nuevos
+        else:
+            sin_cambio += 1
+    return cambiadas, sin_cambio
+
+
+def huella(valor):
+    """CRC32 de un valor de onu_datos, para comparar sin transportar el texto."""
+    if valor is None:
+        return None
+    return zlib.crc32(str(valor).encode('utf-8'))
+
+
+def aplicar_filas(filas):
+    """
+    Escribe {onu_id: {campo: valor, ...}} en onu_datos.
+    Devuelve (actualizados, errores).
+    """
+    if not filas:
+        return 0, []
+
+    ahora = timezone.now()
+
+    # Agrupamos por conjunto de campos: un UPDATE set-based por grupo.
+    # Junto al texto se escriben sus columnas tipadas (normalizacion.py)
+    grupos = defaultdict(list)
+    for onu_id, campos in filas.items():
+        campos = con_tipados(campos)
+        grupos[tuple(sorted(campos))].append((onu_id, campos))
+
+    updated = 0
+    errors = []
+    for campos, grupo in grupos.items():
+        try:
+            with transaction.atomic():
+                updated += len(_update_por_lotes(campos, grupo, ahora))
+        except Exception as e:
+            logger.warning(f"[writer] UPDATE por lotes falló ({e}); reintentando fila a fila")
+            ok, errs = _update_fila_a_fila(grupo, ahora)
+            updated += ok
+            errors.extend(errs)
+
+    logger.debug(f"[writer] {updated} ONUs actualizadas en {len(grupos)} grupos")
+    return updated, errors
+
+
+def upsert_descubrimiento(host, filas):
+    """
+    Inserta o actualiza act_susp para [(snmpindexonu, act_susp), ...] de un
+    host con INSERT ... ON CONFLICT paginado (SNMP_DISCOVERY_LOTE filas por
+    sentencia). Devuelve el número de filas enviadas.
+    """
+    # Un mismo índice dos veces en la misma sentencia haría fallar ON CONFLICT
+    unicas = dict(filas)
+    if not unicas:
+        return 0
+
+    lote = getattr(settings, 'SNMP_DISCOVERY_LOTE', 1000)
+    with connection.cursor() as cursor:
+        execute_values(
+            cursor.cursor,
+            """
+            INSERT INTO onu_datos (snmpindexonu, act_susp, host)
+            VALUES %s
+            ON CONFLICT (snmpindexonu, host)
+            DO UPDATE SET act_susp = EXCLUDED.act_susp
+            """,
+            [(idx, act_susp, host) for idx, act_susp in unicas.items()],
+            page_size=lote
+        )
+    return len(unicas)
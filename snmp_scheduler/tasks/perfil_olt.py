@@ -0,0 +1,74 @@
+# snmp_scheduler/tasks/perfil_olt.py
+
+"""
+Perfil de rendimiento por OLT y chunker adaptativo.
+
+Cada poller_worker registra cuánto tardó su GET (latencia por varbind) y si
+hubo timeout; poller_master usa esas medias para elegir el tamaño de chunk y
+de PDU que deja cada tarea cerca de SNMP_CHUNK_OBJETIVO_SEG, por debajo del
+soft_time_limit del worker.
+"""
+
+from django.conf import settings
+from django.db.models import Case, When, Value, F, FloatField
+from django.utils import timezone
+from ..models import PerfilRendimientoOLT
+from .common import logger
+
+# Peso de la última medición en las medias móviles
+ALFA = 0.3
+
+
+def registrar_medicion(host_ip, varbinds, segundos, timeout=False):
+    """
+    Actualiza las medias móviles del host con una medición de un chunk.
+
+    Un único UPDATE de expresiones F, sin select_for_update: todos los
+    chunks de una OLT escriben la misma fila y no deben hacer cola en su
+    bloqueo al final de cada chunk.
+    """
+    cambios = {
+        'tasa_timeouts': ALFA * (1.0 if timeout else 0.0) + (1 - ALFA) * F('tasa_timeouts'),
+        'muestras': F('muestras') + 1,
+        'actualizado': timezone.now(),
+    }
+    if not timeout and varbinds:
+        latencia = segundos * 1000 / varbinds
+        cambios['latencia_varbind_ms'] = Case(
+            When(muestras=0, then=Value(latencia)),
+            default=ALFA * latencia + (1 - ALFA) * F('latencia_varbind_ms'),
+            output_field=FloatField()
+        )
+
+    try:
+        if not PerfilRendimientoOLT.objects.filter(host_ip=host_ip).update(**cambios):
+            PerfilRendimientoOLT.objects.get_or_create(host_ip=host_ip)
+            PerfilRendimientoOLT.objects.filter(host_ip=host_ip).update(**cambios)
+    except Exception as e:
+        # Las métricas nunca deben tumbar el sondeo
+        logger.warning(f"[perfil_olt] No se pudo registrar medición de {host_ip}: {e}")
+
+
+def calcular_chunk(host_ip):
+    """
+    Devuelve (chunk_size, pdu_size) para el host según su perfil medido.
+    Sin mediciones se usan los valores por defecto.
+    """
+    chunk_defecto = getattr(settings, 'SNMP_CHUNK_DEFECTO', 200)
+    chunk_min = getattr(settings, 'SNMP_CHUNK_MIN', 50)
+    chunk_max = getattr(settings, 'SNMP_CHUNK_MAX', 2000)
+    pdu_min = getattr(settings, 'SNMP_PDU_MIN', 10)
+    pdu_max = getattr(settings, 'SNMP_PDU_MAX', 60)
+    objetivo = getattr(settings, 'SNMP_CHUNK_OBJETIVO_SEG', 60)
+
+    perfil = PerfilRendimientoOLT.objects.filter(host_ip=host_ip).first()
+    if not perfil or not perfil.muestras or perfil.latencia_varbind_ms <= 0:
+        return chunk_defecto, pdu_max
+
+    # Con timeouts frecuentes se reserva margen para los reintentos
+    chunk = objetivo * 1000 / perfil.latencia_varbind_ms * (1 - perfil.tasa_timeouts)
+    chunk = int(min(chunk_max, max(chunk_min, chunk)))
+
+    # Las OLTs que pierden respuestas reciben PDUs más pequeñas
+    pdu = int(min(pdu_max, max(pdu_min, pdu_max * (1 - 2 * perfil.tasa_timeouts))))
+    return chunk, pdu
@@ -3,48 +3,44 @@
 import logging
 from celery import shared_task
 from django.utils import timezone
-from django.db import transaction, close_old_connections
-from ..models import TareaSNMP, EjecucionTareaSNMP, OnuDato
+from django.db import close_old_connections
+from ..models import TareaSNMP, EjecucionTareaSNMP
+from .estado_tarea import cerrar_ejecucion
 
 logger = logging.getLogger(__name__)
 
-@shared_task(name='snmp_scheduler.poller_aggregator')
+@shared_task(name='snmp_scheduler.poller_aggregator', ignore_result=True)
 def poller_aggregator(results, tarea_id, ejecucion_id):
     """
-    Recibe la lista de dicts de cada worker, suma totales,
-    borra índices inválidos y actualiza ejecución y tarea.
+    Recibe la lista de dicts de cada worker (que ya borraron sus ONUs
+    inválidas), suma totales y actualiza y cierra la ejecución.
     """
     close_old_connections()
     tarea = TareaSNMP.objects.get(id=tarea_id)
     ejec  = EjecucionTareaSNMP.objects.get(id=ejecucion_id)
 
     total_updated = sum(r['updated'] for r in results)
+    total_unchanged = sum(r.get('unchanged', 0) for r in results)
     total_deleted = sum(r['deleted'] for r in results)
     all_errors    = [e for r in results for e in r['errors']]
-    invalids      = [i for r in results for i in r.get('to_delete', [])]
-
-    if invalids:
-        with transaction.atomic():
-            OnuDato.objects.filter(
-                host=tarea.host_name,
-                snmpindexonu__in=invalids
-            ).delete()
-        logger.debug(f"[aggregator] Borrados {len(invalids)} índices inválidos")
+    total_errores = sum(r.get('total_errores', len(r['errors'])) for r in results)
 
     # Actualizar TareaSNMP
     tarea.ultima_ejecucion  = timezone.now()
-    tarea.registros_activos = total_updated
+    tarea.registros_activos = total_updated + total_unchanged
     tarea.save(update_fields=['ultima_ejecucion','registros_activos'])
 
-    # Completar registro de EjecucionTareaSNMP
-    ejec.fin       = timezone.now()
-    ejec.estado    = 'C'
+    # Completar registro de EjecucionTareaSNMP (y el estado de la tarea). Es
+    # el único cierre de la ejecución: los workers solo informan sus errores
     ejec.resultado = {
         'updated': total_updated,
+        'unchanged': total_unchanged,
         'deleted': total_deleted,
+        'total_errores': total_errores,
         'errors': all_errors
     }
-    ejec.save()
+    ejec.error = '\n'.join(map(str, all_errors)) if all_errors else None
+    cerrar_ejecucion(ejec, 'C' if not total_errores else 'F')
 
     logger.info(f"[aggregator] Completada ejecución {ejecucion_id}: {ejec.resultado}")
     close_old_connections()
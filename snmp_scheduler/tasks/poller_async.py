@@ -0,0 +1,222 @@
+# snmp_scheduler/tasks/poller_async.py
+
+"""
+Motor de sondeo asíncrono (pysnmp asyncio).
+
+Un solo proceso recorre las columnas de muchas OLTs a la vez: cada columna
+es una corrutina que encadena GETBULK y un semáforo limita cuántas hay en
+vuelo. La escritura en BD se hace después, de forma síncrona, con el mismo
+camino que poller_columna.
+"""
+
+import asyncio
+from celery import shared_task
+from django.conf import settings
+from django.db import close_old_connections, connections
+from pysnmp.hlapi.asyncio import (
+    SnmpEngine, CommunityData, UdpTransportTarget,
+    ContextData, ObjectType, ObjectIdentity, bulkCmd, getCmd
+)
+from pysnmp.proto.rfc1902 import OctetString, IpAddress
+from pysnmp.proto.rfc1905 import EndOfMibView, NoSuchObject, NoSuchInstance
+from ..models import TareaSNMP, EjecucionTareaSNMP
+from .common import logger
+from .poller_worker import TIPO_A_CAMPO
+from .poller_column import cargar_onus_host, aplicar_columna
+from .poller_aggregator import poller_aggregator
+from .limitador_olt import turno_olt_async
+from .carga_chunk import resumir_resultado
+from .estado_tarea import abrir_ejecucion, cerrar_ejecuciones
+
+
+def texto_valor(valor):
+    """
+    Valor SNMP como texto, igual que lo entrega easysnmp: los OctetString
+    con sus octetos tal cual (latin-1) y no el "0x..." hexadecimal con que
+    prettyPrint muestra los no imprimibles (descripciones no ASCII,
+    DateAndTime), que normalizar_valor y a_fecha no entienden.
+    """
+    if isinstance(valor, OctetString) and not isinstance(valor, IpAddress):
+        return valor.asOctets().decode('latin-1')
+    return valor.prettyPrint()
+
+
+async def recorrer_columna_async(engine, host_ip, comunidad, base_oid, max_repeticiones=25):
+    """
+    Recorre la columna `base_oid` de una OLT con GETBULK encadenados y
+    devuelve (pares, completo): la lista de pares (snmpindexonu, valor) y si
+    el recorrido llegó al final real de la columna (OID fuera del subárbol o
+    endOfMibView) y no se cortó por una respuesta vacía o sin avance.
+    """
+    base = tuple(int(x) for x in base_oid.strip('.').split('.'))
+    destino = UdpTransportTarget((host_ip, 161), timeout=6, retries=1)
+    siguiente = ObjectIdentity(base_oid)
+    anterior = base
+    pares = []
+
+    while True:
+        async with turno_olt_async(host_ip, max_repeticiones):
+            errorIndication, errorStatus, _, varBindTable = await bulkCmd(
+                engine,
+                CommunityData(comunidad, mpModel=1),
+                destino,
+                ContextData(),
+                0, max_repeticiones,
+                ObjectType(siguiente),
+                lookupMib=False
+            )
+        if errorIndication:
+            raise RuntimeError(f"{errorIndication}")
+        if errorStatus:
+            raise RuntimeError(errorStatus.prettyPrint())
+
+        ultimo = None
+        for fila in varBindTable:
+            for nombre, valor in fila:
+                oid = tuple(nombre)
+                if oid[:len(base)] != base or isinstance(valor, EndOfMibView):
+                    return pares, True
+                if isinstance(valor, (NoSuchObject, NoSuchInstance)):
+                    return pares, False
+                pares.append((f"{oid[-2]}.{oid[-1]}", texto_valor(valor)))
+                ultimo = nombre
+
+        # Sin avance: terminamos para no repetir la misma petición
+        if ultimo is None or tuple(ultimo) == anterior:
+            return pares, False
+        anterior = tuple(ultimo)
+        siguiente = ObjectIdentity(ultimo)
+
+
+async def sondear_columnas(trabajos, concurrencia, max_repeticiones=25):
+    """
+    Recorre en paralelo las columnas de `trabajos` (dicts con host_ip,
+    comunidad y oid). Devuelve [(trabajo, pares, completo, error)], en el
+    mismo orden.
+    """
+    engine = SnmpEngine()
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def uno(trabajo):
+        async with semaforo:
+            try:
+                pares, completo = await recorrer_columna_async(
+                    engine, trabajo['host_ip'], trabajo['comunidad'], trabajo['oid'], max_repeticiones
+                )
+                return trabajo, pares, completo, None
+            except Exception as e:
+                return trabajo, None, False, str(e)
+
+    try:
+        return await asyncio.gather(*(uno(t) for t in trabajos))
+    finally:
+        engine.transportDispatcher.closeDispatcher()
+
+
+async def sondear_indices(host_ip, comunidad, base_oid, indices, por_pdu=50, ventana=8):
+    """
+    GET de `base_oid.<idx>` para cada índice, con un único engine y
+    transporte, `por_pdu` varbinds por petición y hasta `ventana`
+    peticiones en vuelo. Devuelve ({idx: valor o None si NoSuch*}, errores).
+    """
+    engine = SnmpEngine()
+    comunidad_data = CommunityData(comunidad, mpModel=1)
+    destino = UdpTransportTarget((host_ip, 161), timeout=3.0, retries=1)
+    contexto = ContextData()
+    semaforo = asyncio.Semaphore(ventana)
+    valores = {}
+    errores = []
+
+    async def pedir(bloque):
+        async with semaforo, turno_olt_async(host_ip, len(bloque)):
+            errorIndication, errorStatus, _, varBinds = await getCmd(
+                engine, comunidad_data, destino, contexto,
+                *[ObjectType(ObjectIdentity(f"{base_oid}.{idx}")) for idx in bloque],
+                lookupMib=False
+            )
+        if errorIndication or errorStatus:
+            errores.append(str(errorIndication or errorStatus.prettyPrint()))
+            return
+        for idx, (_, valor) in zip(bloque, varBinds):
+            if isinstance(valor, (NoSuchObject, NoSuchInstance, EndOfMibView)):
+                valores[idx] = None
+            else:
+                valores[idx] = texto_valor(valor)
+
+    try:
+        await asyncio.gather(*(
+            pedir(indices[i:i + por_pdu]) for i in range(0, len(indices), por_pdu)
+        ))
+    finally:
+        engine.transportDispatcher.closeDispatcher()
+    return valores, errores
+
+
+@shared_task(
+    bind=True,
+    name='snmp_scheduler.tasks.poller_async',
+    ignore_result=True,
+    soft_time_limit=600
+)
+def poller_async(self, tarea_ids):
+    """
+    Backend alternativo a poller_worker: sondea todas las tareas bulk
+    indicadas (de cualquier OLT) desde este único proceso.
+    """
+    close_old_connections()
+
+    trabajos = []
+    for tarea in TareaSNMP.objects.filter(pk__in=tarea_ids):
+        campo = TIPO_A_CAMPO.get(tarea.tipo)
+        if not campo or not tarea.get_oid():
+            logger.warning(f"[async] Tarea {tarea.id} sin OID o campo destino, se omite")
+            continue
+        ejec = abrir_ejecucion(tarea.pk)
+        trabajos.append({
+            'tarea_id': tarea.id,
+            'ejecucion_id': ejec.id,
+            'host_name': tarea.host_name,
+            'host_ip': tarea.host_ip,
+            'comunidad': tarea.comunidad,
+            'oid': tarea.get_oid(),
+            'campo': campo,
+        })
+
+    if not trabajos:
+        return
+
+    concurrencia = getattr(settings, 'SNMP_ASYNC_CONCURRENCIA', 200)
+    max_rep = getattr(settings, 'SNMP_BULK_MAX_REPETICIONES', 25)
+    logger.info(f"[async] Sondeando {len(trabajos)} columnas (concurrencia {concurrencia})")
+
+    # Las ejecuciones ya abiertas las cierra poller_aggregator; si el sondeo
+    # falla antes de encolarlo (excepción, soft_time_limit) se cierran aquí
+    pendientes = {trabajo['ejecucion_id'] for trabajo in trabajos}
+    try:
+        # No retenemos la conexión a BD durante la fase de red
+        connections.close_all()
+        respuestas = asyncio.run(sondear_columnas(trabajos, concurrencia, max_rep))
+
+        for trabajo, pares, completo, error in respuestas:
+            if error:
+                error_msg = f"Error SNMP en {trabajo['host_ip']}: {error}"
+                logger.error(error_msg)
+                resultado = {'updated': 0, 'deleted': 0, 'errors': [error_msg]}
+            else:
+                idx_to_id, actuales = cargar_onus_host(trabajo['host_name'], [trabajo['campo']])
+                resultado = aplicar_columna(trabajo['campo'], pares, idx_to_id, actuales, completo)
+            poller_aggregator.delay([resumir_resultado(resultado)], trabajo['tarea_id'], trabajo['ejecucion_id'])
+            pendientes.discard(trabajo['ejecucion_id'])
+    except Exception as e:
+        logger.error(f"[async] Sondeo interrumpido: {e}", exc_info=True)
+        raise
+    finally:
+        if pendientes:
+            close_old_connections()
+            cerrar_ejecuciones(
+                EjecucionTareaSNMP.objects.filter(pk__in=pendientes, estado='E'),
+                'F',
+                error="Sondeo async interrumpido antes de entregar el resultado"
+            )
+        for conn in connections.all():
+            conn.close()
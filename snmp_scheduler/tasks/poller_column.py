@@ -0,0 +1,303 @@
+# snmp_scheduler/tasks/poller_column.py
+
+from collections import defaultdict
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+from django.db import transaction, close_old_connections, connections
+from easysnmp import EasySNMPError, EasySNMPTimeoutError
+from ..models import OnuDato, TareaSNMP
+from .common import logger, obtener_sesion, descartar_sesion
+from .poller_worker import TIPO_A_CAMPO, normalizar_valor, es_valor_invalido
+from .onu_writer import aplicar_filas, filtrar_cambios
+from .poller_aggregator import poller_aggregator
+from .snmp_walker import recorrer_columna, recorrer_columnas
+from .carga_chunk import resumir_resultado
+from .metricas import registrar_metricas
+from .normalizacion import con_tipados
+
+
+def cargar_onus_host(host_name, campos):
+    """
+    Mapeo snmpindexonu -> id y valores actuales de `campos` de todas las
+    ONUs del host, en una única consulta.
+    """
+    recs = OnuDato.objects.filter(host=host_name).values('snmpindexonu', 'id', *campos)
+    idx_to_id = {r['snmpindexonu']: r['id'] for r in recs}
+    actuales = {r['id']: {c: r[c] for c in campos} for r in recs}
+    return idx_to_id, actuales
+
+
+def aplicar_columna(campo, pares, idx_to_id, actuales, completo):
+    """
+    Cruza los pares (snmpindexonu, valor) de un recorrido de la columna con
+    las ONUs del host, escribe solo los valores que cambiaron y borra las
+    ONUs con valor inválido y, si el recorrido fue `completo`, las ausentes.
+    Devuelve el dict de resultado común de los pollers.
+    """
+    sin_registro = 0
+    to_delete = []
+    valores = {}
+    vistos = set()
+
+    for idx, raw in pares:
+        onu_id = idx_to_id.get(idx)
+        if onu_id is None:
+            sin_registro += 1
+            continue
+
+        vistos.add(idx)
+        val = normalizar_valor(campo, raw)
+        if es_valor_invalido(val):
+            to_delete.append(onu_id)
+        else:
+            valores[onu_id] = val
+
+    # Las ONUs que no aparecen en un recorrido completo equivalen a
+    # NoSuchInstance; en uno cortado simplemente no se llegó a ellas
+    if completo:
+        to_delete.extend(idx_to_id[idx] for idx in idx_to_id.keys() - vistos)
+    else:
+        logger.warning(f"Recorrido de {campo} incompleto: no se borran {len(idx_to_id.keys() - vistos)} ONUs no vistas")
+
+    # Histórico: todas las lecturas del ciclo, hayan cambiado o no
+    leidas = {onu_id: {campo: val} for onu_id, val in valores.items()}
+    registrar_metricas(leidas)
+
+    # Solo escribimos las ONUs cuyo valor cambió
+    filas, unchanged = filtrar_cambios(leidas, actuales)
+    updated, errors = aplicar_filas(filas)
+
+    if to_delete:
+        OnuDato.objects.filter(id__in=to_delete).delete()
+        logger.info(f"Eliminados {len(to_delete)} registros")
+
+    return {
+        'updated': updated,
+        'unchanged': unchanged,
+        'deleted': len(to_delete),
+        'sin_registro': sin_registro,
+        'errors': errors,
+    }
+
+
+@shared_task(
+    bind=True,
+    name='snmp_scheduler.tasks.poller_columna',
+    autoretry_for=(EasySNMPTimeoutError,),  # Solo reintentamos timeouts
+    retry_backoff=30,
+    max_retries=2,
+    soft_time_limit=300
+)
+def poller_columna(self, tarea_id, ejecucion_id):
+    """
+    Modo columna: recorre la columna completa del OID de la tarea con GETBULK
+    en una sola pasada y la cruza en memoria con las ONUs del host.
+    Devuelve el mismo dict que poller_worker para reutilizar poller_aggregator.
+    """
+    close_old_connections()
+
+    try:
+        tarea = TareaSNMP.objects.get(pk=tarea_id)
+
+        # La ejecución la cierra poller_aggregator: aquí solo se informan errores
+        campo = TIPO_A_CAMPO.get(tarea.tipo)
+        if not tarea.get_oid() or not campo:
+            error_msg = f"Tarea {tarea_id} sin OID o campo destino para tipo {tarea.tipo}"
+            logger.error(error_msg)
+            return {'updated': 0, 'deleted': 0, 'errors': [error_msg]}
+
+        # Un único query para todo el host, con el valor actual del campo
+        idx_to_id, actuales = cargar_onus_host(tarea.host_name, [campo])
+        if not idx_to_id:
+            return {'updated': 0, 'deleted': 0, 'errors': []}
+
+        # Sesión reutilizada del pool del proceso worker
+        session = obtener_sesion(tarea.host_ip, tarea.comunidad)
+        max_rep = getattr(settings, 'SNMP_BULK_MAX_REPETICIONES', 25)
+
+        completas = set()
+        try:
+            pares = list(recorrer_columna(session, tarea.get_oid(), max_rep, completas))
+        except EasySNMPError as e:
+            descartar_sesion(tarea.host_ip, tarea.comunidad)
+            error_msg = f"Error SNMP en {tarea.host_ip}: {str(e)}"
+            logger.error(error_msg)
+            # Registramos "No identificado" en los ONUs del host (y NULL en
+            # las columnas tipadas derivadas)
+            with transaction.atomic():
+                OnuDato.objects.filter(
+                    host=tarea.host_name
+                ).update(**con_tipados({campo: "No identificado"}), fecha=timezone.now())
+            if isinstance(e, EasySNMPTimeoutError) and self.request.retries < self.max_retries:
+                raise  # Permitimos el reintento
+            # Sin más reintentos se devuelve el error para que el chord siga
+            return {'updated': 0, 'deleted': 0, 'errors': [error_msg]}
+
+        resultado = aplicar_columna(campo, pares, idx_to_id, actuales, completo=bool(completas))
+        logger.info(
+            f"[columna] Ejecución {ejecucion_id}: {resultado['updated']} act, "
+            f"{resultado['unchanged']} sin cambio, {resultado['deleted']} borr, "
+            f"{resultado['sin_registro']} sin registro, {len(resultado['errors'])} err"
+        )
+
+    finally:
+        for conn in connections.all():
+            conn.close()
+
+    return resumir_resultado(resultado)
+
+
+@shared_task(
+    bind=True,
+    name='snmp_scheduler.tasks.poller_perfil',
+    ignore_result=True,  # Entrega sus resultados a poller_aggregator directamente
+    autoretry_for=(EasySNMPTimeoutError,),  # Solo reintentamos timeouts
+    retry_backoff=30,
+    max_retries=2,
+    soft_time_limit=600
+)
+def poller_perfil(self, trabajos):
+    """
+    Modo perfil: todas las tareas bulk de una misma OLT se recorren en una
+    sola pasada con GETBULK intercalados y cada ONU se actualiza con todos
+    sus campos en un único UPDATE.
+
+    `trabajos` es una lista de [tarea_id, ejecucion_id] del mismo host.
+    Al terminar se encola poller_aggregator para cada ejecución.
+    """
+    close_old_connections()
+    ejecuciones = {tarea_id: ejec_id for tarea_id, ejec_id in trabajos}
+    resultados = {}
+    reintentar = False
+    fallo = None
+
+    try:
+        tareas = list(TareaSNMP.objects.filter(pk__in=ejecuciones.keys()))
+
+        # Una columna por tipo aunque varias tareas compartan el mismo tipo
+        columnas = {}
+        tareas_por_tipo = defaultdict(list)
+        for tarea in tareas:
+            if not tarea.get_oid() or tarea.tipo not in TIPO_A_CAMPO:
+                error_msg = f"Tarea {tarea.id} sin OID o campo destino para tipo {tarea.tipo}"
+                logger.error(error_msg)
+                resultados[tarea.id] = {'updated': 0, 'deleted': 0, 'errors': [error_msg]}
+                continue
+            columnas[tarea.tipo] = tarea.get_oid()
+            tareas_por_tipo[tarea.tipo].append(tarea.id)
+
+        if not columnas:
+            return
+
+        ref = next(t for t in tareas if t.tipo in columnas)
+        idx_to_id, actuales = cargar_onus_host(
+            ref.host_name, [TIPO_A_CAMPO[tipo] for tipo in columnas]
+        )
+        if not idx_to_id:
+            for tipo, ids in tareas_por_tipo.items():
+                for tarea_id in ids:
+                    resultados[tarea_id] = {'updated': 0, 'deleted': 0, 'errors': []}
+            return
+
+        # Sesión reutilizada del pool del proceso worker
+        session = obtener_sesion(ref.host_ip, ref.comunidad)
+        max_rep = getattr(settings, 'SNMP_BULK_MAX_REPETICIONES', 25)
+
+        filas = defaultdict(dict)
+        vistos = {tipo: set() for tipo in columnas}
+        to_delete = set()
+        sin_registro = 0
+
+        completas = set()
+        try:
+            for tipo, idx, raw in recorrer_columnas(session, columnas, max_rep, completas):
+                onu_id = idx_to_id.get(idx)
+                if onu_id is None:
+                    sin_registro += 1
+                    continue
+
+                vistos[tipo].add(idx)
+                campo = TIPO_A_CAMPO[tipo]
+                val = normalizar_valor(campo, raw)
+                if es_valor_invalido(val):
+                    to_delete.add(onu_id)
+                else:
+                    filas[onu_id][campo] = val
+        except EasySNMPError as e:
+            descartar_sesion(ref.host_ip, ref.comunidad)
+            error_msg = f"Error SNMP en {ref.host_ip}: {str(e)}"
+            logger.error(error_msg)
+            # Registramos "No identificado" en todos los campos del perfil (y
+            # NULL en las columnas tipadas derivadas)
+            with transaction.atomic():
+                OnuDato.objects.filter(host=ref.host_name).update(
+                    **con_tipados({TIPO_A_CAMPO[tipo]: "No identificado" for tipo in columnas}),
+                    fecha=timezone.now()
+                )
+            if isinstance(e, EasySNMPTimeoutError) and self.request.retries < self.max_retries:
+                reintentar = True  # El aggregator se encola tras el reintento
+                resultados.clear()
+                raise  # Permitimos el reintento
+            for ids in tareas_por_tipo.values():
+                for tarea_id in ids:
+                    resultados[tarea_id] = {'updated': 0, 'deleted': 0, 'errors': [error_msg]}
+            return
+
+        # Las ONUs ausentes en alguna columna recorrida entera equivalen a
+        # NoSuchInstance; en una columna cortada no se llegó a verlas
+        for tipo in columnas:
+            if tipo in completas:
+                to_delete.update(idx_to_id[idx] for idx in idx_to_id.keys() - vistos[tipo])
+            else:
+                logger.warning(f"[perfil] {ref.host_name}: recorrido de {tipo} incompleto, no se borran sus ausentes")
+        for onu_id in to_delete:
+            filas.pop(onu_id, None)
+
+        # Histórico: una muestra por ONU con todas sus columnas
+        registrar_metricas(filas)
+
+        # Solo escribimos los campos que cambiaron
+        cambiadas, _ = filtrar_cambios(filas, actuales)
+        updated, errors = aplicar_filas(cambiadas)
+
+        if to_delete:
+            OnuDato.objects.filter(id__in=to_delete).delete()
+            logger.info(f"Eliminados {len(to_delete)} registros")
+
+        # Los borrados son por ONU, no por columna: se atribuyen a una sola
+        # de las tareas para no contarlos una vez por cada columna del perfil
+        por_atribuir = len(to_delete)
+        for tipo, ids in tareas_por_tipo.items():
+            campo = TIPO_A_CAMPO[tipo]
+            leidos_tipo = sum(1 for campos in filas.values() if campo in campos)
+            cambiados_tipo = sum(1 for campos in cambiadas.values() if campo in campos)
+            for tarea_id in ids:
+                resultados[tarea_id] = {
+                    'updated': cambiados_tipo,
+                    'unchanged': leidos_tipo - cambiados_tipo,
+                    'deleted': por_atribuir,
+                    'errors': list(errors),
+                }
+                por_atribuir = 0
+
+        logger.info(
+            f"[perfil] {ref.host_name}: {len(columnas)} columnas, {updated}/{len(filas)} ONUs con cambios, "
+            f"{len(to_delete)} borr, {sin_registro} sin registro, {len(errors)} err"
+        )
+
+    except Exception as e:
+        if not reintentar:
+            # Cualquier otro fallo cierra igualmente todas las ejecuciones
+            fallo = f"Error en el sondeo de perfil: {str(e)}"
+            logger.error(fallo, exc_info=True)
+        raise
+
+    finally:
+        for conn in connections.all():
+            conn.close()
+        if fallo:
+            for tarea_id in ejecuciones:
+                resultados.setdefault(tarea_id, {'updated': 0, 'deleted': 0, 'errors': []})['errors'].append(fallo)
+        for tarea_id, resultado in resultados.items():
+            poller_aggregator.delay([resumir_resultado(resultado)], tarea_id, ejecuciones[tarea_id])
@@ -1,10 +1,19 @@
 import logging
+from collections import defaultdict
 from celery import shared_task, chord
+from django.conf import settings
 from django.utils import timezone
 from django.db import close_old_connections
-from ..models import TareaSNMP, OnuDato, EjecucionTareaSNMP
-from .poller_worker import poller_worker
+from ..models import TareaSNMP, OnuDato
+from .poller_worker import poller_worker, TIPO_A_CAMPO
+from .poller_column import poller_columna, poller_perfil
+from .poller_async import poller_async
 from .poller_aggregator import poller_aggregator
+from .perfil_olt import calcular_chunk
+from .onu_writer import huella
+from .carga_chunk import empaquetar_chunk
+from .contador_chord import iniciar_contador
+from .estado_tarea import abrir_ejecucion, cerrar_ejecucion
 
 logger = logging.getLogger(__name__)
 
@@ -16,8 +25,7 @@ TIPOS_PERMITIDOS = [
 
 @shared_task(
     bind=True,
-    name='snmp_scheduler.tasks.ejecutar_bulk_wrapper',
-    queue='principal'
+    name='snmp_scheduler.tasks.ejecutar_bulk_wrapper'
 )
 def ejecutar_bulk_wrapper(self, tarea_id=None):
     """
@@ -49,34 +57,80 @@ def ejecutar_bulk_wrapper(self, tarea_id=None):
                      .order_by('modo')
         )
 
+    # Backend asíncrono: un único proceso sondea todas las tareas
+    if getattr(settings, 'SNMP_BULK_MODO', 'indices') == 'async':
+        poller_async.delay([tarea.id for tarea in tareas])
+        return
+
     # 2) Procesar cada tarea
     for tarea in tareas:
         logger.info(f"[master] Ejecutando tarea {tarea.id} ({tarea.tipo})")
-        ejec = EjecucionTareaSNMP.objects.create(
-            tarea=tarea,
-            inicio=ahora,
-            estado='E'
-        )
+        ejec = abrir_ejecucion(tarea.pk)
 
-        # 3) Obtener índices existentes para ese host
-        onus = list(
-            OnuDato.objects
-                   .filter(host=tarea.host_name)
-                   .values_list('snmpindexonu', flat=True)
-        )
+        # Modo columna: un único GETBULK por columna, sin chunks de índices
+        # (en modo perfil una tarea suelta se trata igual que en modo columna)
+        if getattr(settings, 'SNMP_BULK_MODO', 'indices') in ('columna', 'perfil'):
+            chord([poller_columna.s(tarea.id, ejec.id)])(poller_aggregator.s(tarea.id, ejec.id))
+            continue
+
+        # 3) Obtener índices existentes para ese host, una sola vez por ejecución:
+        #    cada chunk lleva [id, snmpindexonu, huella del valor actual]
+        campo = TIPO_A_CAMPO[tarea.tipo]
+        onus = [
+            [onu_id, idx, huella(valor)]
+            for onu_id, idx, valor in OnuDato.objects
+                                             .filter(host=tarea.host_name)
+                                             .values_list('id', 'snmpindexonu', campo)
+                                             .iterator()
+        ]
         if not onus:
-            ejec.fin = timezone.now()
-            ejec.estado = 'C'
             ejec.resultado = {'updated': 0, 'deleted': 0, 'errors': []}
-            ejec.save()
+            cerrar_ejecucion(ejec, 'C')
             continue
 
-        # 4) Dividir en chunks y lanzar el chord
-        chunk_size = getattr(tarea, 'chunk_size', 200) or 200
+        # 4) Dividir en chunks según el rendimiento medido de la OLT y lanzar el chord
+        chunk_size, pdu_size = calcular_chunk(tarea.host_ip)
         chunks = [onus[i:i + chunk_size] for i in range(0, len(onus), chunk_size)]
-        
-        header = [poller_worker.s(tarea.id, ejec.id, chunk) for chunk in chunks]
+        logger.debug(f"[master] {tarea.host_ip}: chunk {chunk_size}, PDU {pdu_size}")
+
+        # Modo contador: chunks sin resultado en el backend, unidos en Redis
+        if (getattr(settings, 'SNMP_POLLER_RESULTADOS', 'chord') == 'contador'
+                and iniciar_contador(ejec.id, len(chunks))):
+            for chunk in chunks:
+                poller_worker.apply_async(
+                    (tarea.id, ejec.id, empaquetar_chunk(chunk), pdu_size),
+                    {'contador': True},
+                    ignore_result=True
+                )
+            continue
+
+        header = [poller_worker.s(tarea.id, ejec.id, empaquetar_chunk(chunk), pdu_size) for chunk in chunks]
         callback = poller_aggregator.s(tarea.id, ejec.id)
         chord(header)(callback)
 
-    close_old_connections()
\ No newline at end of file
+    close_old_connections()
+
+
+@shared_task(
+    bind=True,
+    name='snmp_scheduler.tasks.ejecutar_bulk_perfil'
+)
+def ejecutar_bulk_perfil(self, tarea_ids):
+    """
+    Modo perfil: agrupa las tareas bulk por OLT y lanza un único
+    poller_perfil por host que recorre todas sus columnas a la vez.
+    """
+    close_old_connections()
+
+    tareas = TareaSNMP.objects.filter(pk__in=tarea_ids, tipo__in=TIPOS_PERMITIDOS)
+
+    perfiles = defaultdict(list)
+    for tarea in tareas:
+        ejec = abrir_ejecucion(tarea.pk)
+        perfiles[(tarea.host_ip, tarea.comunidad, tarea.host_name)].append([tarea.id, ejec.id])
+
+    for (host_ip, _, host_name), trabajos in perfiles.items():
+        logger.info(f"[master] Perfil {host_name} ({host_ip}): {len(trabajos)} columnas")
+        poller_perfil.delay(trabajos)
+
+    close_old_connections()
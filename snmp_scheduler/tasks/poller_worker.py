@@ -1,12 +1,21 @@
 # snmp_scheduler/tasks/poller_worker.py
 
 import logging
+import time
 from celery import shared_task
 from django.utils import timezone
 from django.db import close_old_connections, transaction, connections
-from easysnmp import Session, EasySNMPError, EasySNMPTimeoutError
-from ..models import OnuDato, TareaSNMP, EjecucionTareaSNMP
-from .common import logger
+from easysnmp import EasySNMPError, EasySNMPTimeoutError
+from ..models import OnuDato, TareaSNMP
+from .common import logger, obtener_sesion, descartar_sesion
+from .snmp_walker import oid_completo, indice_onu
+from .onu_writer import aplicar_filas, filtrar_cambios, huella
+from .perfil_olt import registrar_medicion
+from .limitador_olt import turno_olt
+from .carga_chunk import desempaquetar_chunk, resumir_resultado
+from .contador_chord import acumular_resultado
+from .metricas import registrar_metricas
+from .normalizacion import con_tipados
 
 TIPO_A_CAMPO = {
     'descubrimiento': 'act_susp',
@@ -20,178 +29,208 @@ TIPO_A_CAMPO = {
     'modelo_onu': 'modelo_onu'
 }
 
-@shared_task(
-    bind=True,
-    name='snmp_scheduler.tasks.poller_worker',
-    autoretry_for=(EasySNMPTimeoutError,),  # Solo reintentamos timeouts
-    retry_backoff=30,
-    max_retries=2,
-    soft_time_limit=120  # Aumentamos el límite de tiempo
-)
-def poller_worker(self, tarea_id, ejecucion_id, indices):
+
+def normalizar_valor(campo, val):
+    """Limpia el valor SNMP y aplica el formato propio del campo destino."""
+    val = (val or "").strip().strip('"')
+
+    if campo == 'distancia_m':
+        if val == "-1":
+            val = "No Distancia"
+        else:
+            try:
+                km = float(val) / 1000
+                val = f"{km:.3f} km"
+            except:
+                val = "Error formato"
+    return val
+
+
+def es_valor_invalido(val):
+    """Valores vacíos o NoSuch* indican que la ONU ya no existe en la OLT."""
+    return not val or 'no such' in val.lower() or val.upper() in ('NOSUCHINSTANCE', 'NOSUCHOBJECT')
+
+
+def _sondear_chunk(tarea_id, ejecucion_id, indices, pdu_size=None, reintento=False):
     close_old_connections()
 
     try:
         tarea = TareaSNMP.objects.get(pk=tarea_id)
-        ejec = EjecucionTareaSNMP.objects.get(pk=ejecucion_id)
 
+        # La ejecución es de todos los chunks: la cierra poller_aggregator y
+        # aquí solo se informan los errores en el resultado
         # Validaciones críticas PRIMERO
         if not tarea.get_oid():
             error_msg = f"Tarea {tarea_id} sin OID configurado"
             logger.error(error_msg)
-            ejec.error = error_msg
-            ejec.estado = 'F'
-            ejec.fin = timezone.now()
-            ejec.save()
-            return {'updated': 0, 'deleted': 0, 'errors': [error_msg], 'to_delete': []}
+            return {'updated': 0, 'deleted': 0, 'errors': [error_msg]}
             
         campo = TIPO_A_CAMPO.get(tarea.tipo)
         if not campo:
             error_msg = f"Tipo {tarea.tipo} no tiene campo destino definido"
             logger.error(error_msg)
-            ejec.error = error_msg
-            ejec.estado = 'F'
-            ejec.fin = timezone.now()
-            ejec.save()
-            return {'updated': 0, 'deleted': 0, 'errors': [error_msg], 'to_delete': []}
+            return {'updated': 0, 'deleted': 0, 'errors': [error_msg]}
 
         # Logs DEBUG después de validaciones
         logger.debug(f"[DEBUG] OID: {tarea.get_oid()}, Campo: {campo}")
         
-        # Configuración SNMP con timeout mínimo de 6 segundos
-        session = Session(
-            hostname=tarea.host_ip,
-            community=tarea.comunidad,
-            version=2,
-            timeout=6,  # Timeout mínimo de 6 segundos
-            retries=1
-        )
-
-        # Mapeo de índices (usar host_name según modelo)
-        recs = OnuDato.objects.filter(
-            host=tarea.host_name,
-            snmpindexonu__in=indices
-        ).values('id', 'snmpindexonu')
-        
-        idx_to_id = {r['snmpindexonu']: r['id'] for r in recs}
+        # Sesión SNMP (timeout mínimo de 6 segundos) reutilizada del pool del proceso
+        session = obtener_sesion(tarea.host_ip, tarea.comunidad)
+
+        # Mapeo de índices: poller_master envía [id, snmpindexonu, huella del
+        # valor actual] por ONU, así el worker no consulta la BD antes del GET
+        indices = desempaquetar_chunk(indices)
+        if indices and isinstance(indices[0], (list, tuple)) and not reintento:
+            idx_to_id = {idx: onu_id for onu_id, idx, _ in indices}
+            actuales = {onu_id: {campo: h} for onu_id, idx, h in indices}
+            indices = [idx for _, idx, _ in indices]
+        else:
+            # Mensajes con el formato anterior (solo índices) o reintentos: en
+            # un reintento las huellas del mensaje ya no valen porque el
+            # intento anterior escribió "No identificado" en todo el chunk
+            if indices and isinstance(indices[0], (list, tuple)):
+                indices = [idx for _, idx, _ in indices]
+            recs = OnuDato.objects.filter(
+                host=tarea.host_name,
+                snmpindexonu__in=indices
+            ).values('id', 'snmpindexonu', campo)
+            idx_to_id = {r['snmpindexonu']: r['id'] for r in recs}
+            actuales = {r['id']: {campo: huella(r[campo])} for r in recs}
         logger.info(f"Mapeados {len(idx_to_id)}/{len(indices)} índices")
 
         # Construcción y consulta OIDs
         base_oid = tarea.get_oid()
         oid_list = [f"{base_oid}.{idx}" for idx in indices]
-        
+        pdu_size = pdu_size or len(oid_list)
+
+        # GETs de pdu_size varbinds, cronometrados para el perfil de la OLT.
+        # Solo cuenta el tiempo de los GET: la espera por turno del limitador
+        # no es latencia de la OLT
+        segundos_get = 0.0
         try:
-            vars = session.get(oid_list)
+            vars = []
+            for i in range(0, len(oid_list), pdu_size):
+                bloque = oid_list[i:i + pdu_size]
+                with turno_olt(tarea.host_ip, len(bloque)):
+                    inicio_get = time.monotonic()
+                    try:
+                        vars.extend(session.get(bloque))
+                    finally:
+                        segundos_get += time.monotonic() - inicio_get
+            registrar_medicion(tarea.host_ip, len(oid_list), segundos_get)
         except EasySNMPTimeoutError as e:
+            descartar_sesion(tarea.host_ip, tarea.comunidad)
+            registrar_medicion(tarea.host_ip, len(oid_list), segundos_get, timeout=True)
             error_msg = f"Timeout SNMP en {tarea.host_ip}: {str(e)}"
             logger.error(error_msg)
-            # Registramos el error en la ejecución
-            ejec.error = error_msg
-            ejec.estado = 'F'
-            ejec.fin = timezone.now()
-            ejec.save()
-            # Registramos "No identificado" en los ONUs afectados
+            # Registramos "No identificado" en los ONUs afectados (y NULL en
+            # las columnas tipadas derivadas)
             with transaction.atomic():
                 OnuDato.objects.filter(
                     host=tarea.host_name,
                     snmpindexonu__in=indices
-                ).update(**{campo: "No identificado", 'fecha': timezone.now()})
+                ).update(**con_tipados({campo: "No identificado"}), fecha=timezone.now())
             raise  # Permitimos el reintento
         except EasySNMPError as e:
+            descartar_sesion(tarea.host_ip, tarea.comunidad)
             error_msg = f"Error SNMP en {tarea.host_ip}: {str(e)}"
             logger.error(error_msg)
-            ejec.error = error_msg
-            ejec.estado = 'F'
-            ejec.fin = timezone.now()
-            ejec.save()
-            # Registramos "No identificado" en los ONUs afectados
+            # Registramos "No identificado" en los ONUs afectados (y NULL en
+            # las columnas tipadas derivadas)
             with transaction.atomic():
                 OnuDato.objects.filter(
                     host=tarea.host_name,
                     snmpindexonu__in=indices
-                ).update(**{campo: "No identificado", 'fecha': timezone.now()})
-            return {'updated': 0, 'deleted': 0, 'errors': [error_msg], 'to_delete': []}
+                ).update(**con_tipados({campo: "No identificado"}), fecha=timezone.now())
+            return {'updated': 0, 'deleted': 0, 'errors': [error_msg]}
 
-        updated = deleted = 0
+        deleted = 0
         errors = []
         to_delete = []
+        valores = {}
 
         # Procesar respuestas
         for var in vars:
-            parts = var.oid.split('.')
-            if len(parts) < 2:
+            idx = indice_onu(oid_completo(var))
+            if not idx:
                 errors.append(f"OID inválido: {var.oid}")
                 continue
-                
-            idx = f"{parts[-2]}.{parts[-1]}"
             
             if idx not in idx_to_id:
                 errors.append(f"Índice {idx} no existe en BD")
                 continue
 
             onu_id = idx_to_id[idx]
-            val = (var.value or "").strip().strip('"')
-            
-            if campo == 'distancia_m':
-                if val == "-1":
-                    val = "No Distancia"
-                else:
-                    try:
-                        km = float(val) / 1000
-                        val = f"{km:.3f} km"
-                    except:
-                        val = "Error formato"
+            val = normalizar_valor(campo, var.value)
 
             # Validación y actualización
-            if not val or 'no such' in val.lower() or val.upper() in ('NOSUCHINSTANCE', 'NOSUCHOBJECT'):
+            if es_valor_invalido(val):
                 to_delete.append(onu_id)
                 deleted += 1
                 logger.debug(f"Borrando {onu_id} (valor inválido)")
             else:
-                try:
-                    with transaction.atomic():
-                        OnuDato.objects.filter(id=onu_id).update(
-                            **{campo: val, 'fecha': timezone.now()}
-                        )
-                        updated += 1
-                        logger.debug(f"Actualizado {campo}={val} ({onu_id})")
-                except Exception as e:
-                    error_msg = f"Error BD: {str(e)}"
-                    errors.append(error_msg)
-                    logger.error(f"Fallo actualizando {onu_id}: {str(e)}")
-                    # Registramos "No identificado" para este ONU
-                    try:
-                        OnuDato.objects.filter(id=onu_id).update(
-                            **{campo: "No identificado", 'fecha': timezone.now()}
-                        )
-                    except:
-                        pass
+                valores[onu_id] = val
+
+        # Histórico: todas las lecturas del ciclo, hayan cambiado o no
+        leidas = {onu_id: {campo: val} for onu_id, val in valores.items()}
+        registrar_metricas(leidas)
+
+        # Solo escribimos las ONUs cuyo valor cambió (comparando huellas)
+        filas, unchanged = filtrar_cambios(leidas, actuales, huella)
+        updated, errores_bd = aplicar_filas(filas)
+        errors.extend(errores_bd)
 
         if to_delete:
             OnuDato.objects.filter(id__in=to_delete).delete()
             logger.info(f"Eliminados {len(to_delete)} registros")
 
-        logger.info(f"Ejecución {ejecucion_id}: {updated} act, {deleted} borr, {len(errors)} err")
-
-        # Actualizar estado de ejecución
-        ejec.fin = timezone.now()
-        ejec.estado = 'C' if not errors else 'F'
-        ejec.error = '\n'.join(errors) if errors else None
-        ejec.resultado = {
-            'updated': updated,
-            'deleted': deleted,
-            'errors': errors,
-            'to_delete': to_delete,
-        }
-        ejec.save()
+        logger.info(f"Ejecución {ejecucion_id}: {updated} act, {unchanged} sin cambio, {deleted} borr, {len(errors)} err")
 
     finally:
         for conn in connections.all():
             conn.close()
 
-    return {
+    # Al result backend solo viajan contadores y una muestra de errores
+    return resumir_resultado({
         'updated': updated,
+        'unchanged': unchanged,
         'deleted': deleted,
         'errors': errors,
-        'to_delete': to_delete,
-    }
\ No newline at end of file
+    })
+
+
+@shared_task(
+    bind=True,
+    name='snmp_scheduler.tasks.poller_worker',
+    autoretry_for=(EasySNMPTimeoutError,),  # Solo reintentamos timeouts
+    retry_backoff=30,
+    max_retries=2,
+    soft_time_limit=120  # Aumentamos el límite de tiempo
+)
+def poller_worker(self, tarea_id, ejecucion_id, indices, pdu_size=None, contador=False):
+    """
+    Sondea un chunk de ONUs. Con `contador` (SNMP_POLLER_RESULTADOS =
+    'contador') el resultado no se devuelve al chord sino que se suma en
+    Redis, y el último chunk encola poller_aggregator.
+    """
+    try:
+        resultado = _sondear_chunk(
+            tarea_id, ejecucion_id, indices, pdu_size, reintento=self.request.retries > 0
+        )
+    except EasySNMPTimeoutError as e:
+        if self.request.retries < self.max_retries:
+            raise  # Permitimos el reintento
+        # Sin más reintentos el chunk cuenta como terminado con error, para
+        # que el chord (o el contador) llegue igualmente a poller_aggregator
+        resultado = resumir_resultado({'errors': [f"Timeout SNMP: {str(e)}"]})
+    except Exception as e:
+        # Cualquier otro fallo (incluido SoftTimeLimitExceeded) también cierra
+        # el chunk con error: sin él el contador no llegaría a cero y la
+        # ejecución quedaría en curso para siempre
+        logger.error(f"Chunk de la ejecución {ejecucion_id} fallido: {e}", exc_info=True)
+        resultado = resumir_resultado({'errors': [f"Error en el chunk: {str(e)}"]})
+
+    if contador:
+        acumular_resultado(tarea_id, ejecucion_id, resumir_resultado(resultado))
+        return None
+    return resultado
@@ -1,14 +1,19 @@
 # snmp_scheduler/tasks/scheduler.py
 
 import logging
+import zlib
+from collections import defaultdict
 from celery import shared_task, chord
+from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta, datetime
-from django.db.models import Q
+from django.db.models import Q, F
 
-from ..models import TareaSNMP
+from ..models import TareaSNMP, EjecucionTareaSNMP, EstadoTareaSNMP
 from .snmp_discovery import ejecutar_descubrimiento
-from .poller_master import ejecutar_bulk_wrapper
+from .poller_master import ejecutar_bulk_wrapper, ejecutar_bulk_perfil
+from .poller_async import poller_async
+from .estado_tarea import cerrar_ejecuciones, conciliar_en_curso
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +23,15 @@ TIPOS_BULK = [
     'distancia_m', 'modelo_onu'
 ]
 
+# Orden de las fases del modo secuencial
+MODOS = ['principal', 'modo', 'secundario']
+
+# Separación entre ticks del beat (cada 15 minutos)
+INTERVALO_SEG = 15 * 60
+
+# Periodo de cada tarea: una vez por hora, en su intervalo ('00', '15', ...)
+PERIODO_TAREA_SEG = 60 * 60
+
 def get_current_interval(time):
     """Calcula el intervalo actual (00, 15, 30, 45)"""
     minute = time.minute
@@ -95,7 +109,7 @@ def should_execute_task(tarea, ahora):
     
     # Si nunca se ha ejecutado, debe ejecutarse
     if not tarea.ultima_ejecucion:
-        logger.info(f"[scheduler] Tarea {tarea.nombre} nunca ejecutada - ejecutando ahora")
+        logger.debug(f"[scheduler] Tarea {tarea.nombre} nunca ejecutada - ejecutando ahora")
         return True
     
     # Calcular el próximo tiempo de ejecución basado en el intervalo
@@ -104,27 +118,126 @@ def should_execute_task(tarea, ahora):
     should_run = ahora >= next_execution
     
     if should_run:
-        logger.info(f"[scheduler] Tarea {tarea.nombre} debe ejecutarse - última: {tarea.ultima_ejecucion}, próxima: {next_execution}, ahora: {ahora}")
+        logger.debug(f"[scheduler] Tarea {tarea.nombre} debe ejecutarse - última: {tarea.ultima_ejecucion}, próxima: {next_execution}, ahora: {ahora}")
     else:
-        logger.info(f"[scheduler] Tarea {tarea.nombre} no debe ejecutarse aún - última: {tarea.ultima_ejecucion}, próxima: {next_execution}, ahora: {ahora}")
+        logger.debug(f"[scheduler] Tarea {tarea.nombre} no debe ejecutarse aún - última: {tarea.ultima_ejecucion}, próxima: {next_execution}, ahora: {ahora}")
     
     return should_run
 
+def planificar_intervalo(ahora, intervalo):
+    """
+    Única consulta del tick: todas las tareas activas del intervalo, de
+    todas las fases, filtradas en memoria con should_execute_task.
+    Devuelve las tareas elegibles ordenadas por fase.
+    """
+    qs = (
+        TareaSNMP.objects
+                 .filter(activa=True, modo__in=MODOS, intervalo=intervalo)
+                 .select_related('estado')
+                 .only('id', 'nombre', 'modo', 'tipo', 'host_name', 'intervalo', 'ultima_ejecucion',
+                       'estado__en_curso', 'estado__ultimo_inicio')
+    )
+    tareas = [t for t in qs if should_execute_task(t, ahora)]
+    tareas.sort(key=lambda t: MODOS.index(t.modo))
+    tareas = _descartar_solapes(tareas, ahora)
+    logger.info(f"[scheduler] Intervalo {intervalo}: {len(tareas)} tareas elegibles")
+    return tareas
+
+def _descartar_solapes(tareas, ahora):
+    """
+    Quita las tareas cuya ejecución anterior sigue en curso (en_curso de
+    EstadoTareaSNMP, ya cargado con la tarea y conciliado con las ejecuciones
+    'E' reales): el ciclo en vuelo ya cubre el intervalo, así que el nuevo se
+    omite y se cuenta en ejecuciones_omitidas.
+    Si la última ejecución empezó hace más de SNMP_EJECUCION_MAX_SEG se da
+    por abandonada (worker caído, chord perdido): sus ejecuciones 'E' se
+    marcan como fallidas y la tarea se lanza con normalidad. El límite debe
+    superar PERIODO_TAREA_SEG: en el siguiente turno de la tarea la ejecución
+    anterior lleva una hora abierta y debe omitirse, no abandonarse.
+    """
+    if getattr(settings, 'SNMP_SOLAPE_POLITICA', 'omitir') != 'omitir' or not tareas:
+        return tareas
+
+    limite = ahora - timedelta(seconds=getattr(settings, 'SNMP_EJECUCION_MAX_SEG', PERIODO_TAREA_SEG * 3 // 2))
+    # Un contador desviado (ejecución borrada o sin cierre) no debe bloquear la tarea
+    conciliar_en_curso([
+        t.estado for t in tareas if getattr(t, 'estado', None) and t.estado.en_curso
+    ])
+    en_curso = {}
+    for t in tareas:
+        estado = getattr(t, 'estado', None)
+        if estado and estado.en_curso:
+            en_curso[t.pk] = estado
+
+    abandonadas = {
+        pk for pk, estado in en_curso.items()
+        if not estado.ultimo_inicio or estado.ultimo_inicio < limite
+    }
+    if abandonadas:
+        cerrar_ejecuciones(
+            EjecucionTareaSNMP.objects.filter(tarea_id__in=abandonadas, estado='E', inicio__lt=limite),
+            'F',
+            error=f"Ejecución abandonada: seguía en curso tras {int((ahora - limite).total_seconds())}s"
+        )
+        # Ninguna ejecución empezó después del límite: no queda nada en curso
+        EstadoTareaSNMP.objects.filter(tarea_id__in=abandonadas).update(en_curso=0)
+        TareaSNMP.objects.filter(pk__in=abandonadas).update(
+            ejecuciones_abandonadas=F('ejecuciones_abandonadas') + 1
+        )
+        logger.warning(f"[scheduler] {len(abandonadas)} tareas con ejecuciones abandonadas marcadas como fallidas")
+
+    ocupadas = en_curso.keys() - abandonadas
+    if ocupadas:
+        TareaSNMP.objects.filter(pk__in=ocupadas).update(
+            ejecuciones_omitidas=F('ejecuciones_omitidas') + 1,
+            ultimo_solape=ahora
+        )
+        logger.warning(f"[scheduler] {len(ocupadas)} tareas omitidas: la ejecución anterior sigue en curso")
+
+    return [t for t in tareas if t.pk not in ocupadas]
+
+def _lotes_por_fase(tareas):
+    """{modo: {'desc': [ids], 'bulk': [ids]}} para el modo secuencial."""
+    lotes = {modo: {'desc': [], 'bulk': []} for modo in MODOS}
+    for t in tareas:
+        if t.tipo == "descubrimiento":
+            lotes[t.modo]['desc'].append(t.pk)
+        elif t.tipo in TIPOS_BULK:
+            lotes[t.modo]['bulk'].append(t.pk)
+    return lotes
+
+def _encolar_bulk(bulk_ids, etiqueta):
+    """Encola las tareas bulk indicadas según SNMP_BULK_MODO."""
+    if not bulk_ids:
+        return
+    modo_bulk = getattr(settings, 'SNMP_BULK_MODO', 'indices')
+    if modo_bulk == 'perfil':
+        # Un único recorrido por OLT con todas sus columnas
+        ejecutar_bulk_perfil.delay(bulk_ids)
+        logger.info(f"[scheduler] Encolado perfil bulk con {len(bulk_ids)} tareas ({etiqueta})")
+    elif modo_bulk == 'async':
+        # Todas las tareas en un único proceso asíncrono
+        poller_async.delay(bulk_ids)
+        logger.info(f"[scheduler] Encolado sondeo async con {len(bulk_ids)} tareas ({etiqueta})")
+    else:
+        for tarea_id in bulk_ids:
+            ejecutar_bulk_wrapper.delay(tarea_id)
+            logger.info(f"[scheduler] Encolado tarea bulk#{tarea_id} ({etiqueta})")
+
 @shared_task(name="snmp_scheduler.tasks._execute_bulk_and_next")
-def _execute_bulk_and_next(header_results, bulk_ids, modo_actual, modos_restantes):
+def _execute_bulk_and_next(header_results, bulk_ids, modo_actual, modos_restantes, lotes=None):
     """
     Callback tras completar todos los 'descubrimiento' de la fase current:
     - header_results: lista de resultados del discovery (ignoramos aquí)
     - bulk_ids: lista de IDs de tareas datos_bulk para encolar ahora
     - modo_actual: nombre de la fase actual ('principal','modo','secundario')
     - modos_restantes: lista de las fases que faltan tras ésta
+    - lotes: tareas ya seleccionadas por fase en el tick (planificar_intervalo)
     """
     logger.info(f"[scheduler] Ejecutando bulk y siguiente fase. Modo actual: {modo_actual}, Modos restantes: {modos_restantes}")
     
     # 1) Encolar todos los datos_bulk de esta fase
-    for tarea_id in bulk_ids:
-        ejecutar_bulk_wrapper.delay(tarea_id)
-        logger.info(f"[scheduler] Encolado tarea bulk#{tarea_id} ({modo_actual})")
+    _encolar_bulk(bulk_ids, modo_actual)
 
     # 2) Lanzar inmediatamente la siguiente fase, si la hay
     if modos_restantes:
@@ -132,57 +245,113 @@ def _execute_bulk_and_next(header_results, bulk_ids, modo_actual, modos_restante
         resto = modos_restantes[1:]
         logger.info(f"[scheduler] Iniciando siguiente fase: {siguiente}")
         # Iniciamos la fase siguiente sin header_results
-        _start_fase.delay([], siguiente, resto)
+        _start_fase.delay([], siguiente, resto, lotes)
     else:
         logger.info(f"[scheduler] Finalizada cadena de ejecución en modo {modo_actual}")
 
 @shared_task(name="snmp_scheduler.tasks._start_fase")
-def _start_fase(header_results, modo_actual, modos_restantes):
+def _start_fase(header_results, modo_actual, modos_restantes, lotes=None):
     """
     Inicia la fase indicada en el orden:
     principal -> modo -> secundario
+    `lotes` trae las tareas de cada fase ya seleccionadas en el tick; sin
+    él (mensajes antiguos) se vuelven a seleccionar aquí.
     """
-    ahora = timezone.localtime()
-    intervalo = get_current_interval(ahora)
-    logger.info(f"[scheduler] Iniciando fase '{modo_actual}' en intervalo {intervalo}")
-    logger.info(f"[scheduler] Modos restantes después de esta fase: {modos_restantes}")
-
-    # Obtener el intervalo actual
-    intervalos = get_intervals_to_execute(ahora)
-    logger.info(f"[scheduler] Intervalos a ejecutar: {intervalos}")
-
-    # Filtrar tareas candidatas para esta fase y el intervalo actual
-    qs = TareaSNMP.objects.filter(
-        activa=True,
-        modo=modo_actual,
-        intervalo=intervalo  # Buscar sin paréntesis
-    )
-    
-    logger.info(f"[scheduler] Encontradas {len(qs)} tareas para modo {modo_actual} en intervalo {intervalo}")
-    
-    # Luego filtramos por tiempo de ejecución
-    tareas_a_ejecutar = [t for t in qs if should_execute_task(t, ahora)]
+    if lotes is None:
+        ahora = timezone.localtime()
+        lotes = _lotes_por_fase(planificar_intervalo(ahora, get_current_interval(ahora)))
 
-    desc_ids = [t.pk for t in tareas_a_ejecutar if t.tipo == "descubrimiento"]
-    bulk_ids = [t.pk for t in tareas_a_ejecutar if t.tipo in TIPOS_BULK]
+    lote = lotes.get(modo_actual, {'desc': [], 'bulk': []})
+    desc_ids = lote['desc']
+    bulk_ids = lote['bulk']
 
-    logger.info(f"[scheduler] Fase '{modo_actual}': {len(desc_ids)} discovery, {len(bulk_ids)} bulk")
-    logger.info(f"[scheduler] Tareas a ejecutar en modo {modo_actual}: {[t.nombre for t in tareas_a_ejecutar]}")
+    logger.info(f"[scheduler] Fase '{modo_actual}': {len(desc_ids)} discovery, {len(bulk_ids)} bulk (restantes: {modos_restantes})")
 
     # Si no hay descubrimiento, saltamos a bulk y luego a la siguiente fase
     if not desc_ids:
-        logger.info(f"[scheduler] No hay tareas discovery en fase {modo_actual}, pasando a bulk y siguientes fases")
-        return _execute_bulk_and_next.delay([], bulk_ids, modo_actual, modos_restantes)
+        return _execute_bulk_and_next.delay([], bulk_ids, modo_actual, modos_restantes, lotes)
 
     # Si hay discovery, los ejecutamos en chord, luego bulk y siguiente fase
     header = [ejecutar_descubrimiento.s(tid) for tid in desc_ids]
-    callback = _execute_bulk_and_next.s(bulk_ids, modo_actual, modos_restantes)
+    callback = _execute_bulk_and_next.s(bulk_ids, modo_actual, modos_restantes, lotes)
     chord(header)(callback)
     logger.info(f"[scheduler] Chord discovery fase='{modo_actual}' lanzado")
 
+@shared_task(name="snmp_scheduler.tasks._execute_bulk_host")
+def _execute_bulk_host(header_results, bulk_ids, host_name):
+    """
+    Callback del modo DAG tras el descubrimiento de un único host:
+    encola solo las tareas bulk de ese host.
+    """
+    logger.info(f"[scheduler] Discovery de {host_name} terminado, encolando {len(bulk_ids)} bulk")
+    _encolar_bulk(bulk_ids, host_name)
+
+@shared_task(name="snmp_scheduler.tasks._lanzar_host")
+def _lanzar_host(desc_ids, bulk_ids, host_name):
+    """Nodo del DAG de un host: discovery (si hay) y después su bulk."""
+    if desc_ids:
+        header = [ejecutar_descubrimiento.s(tid) for tid in desc_ids]
+        chord(header)(_execute_bulk_host.s(bulk_ids, host_name))
+    else:
+        _encolar_bulk(bulk_ids, host_name)
+
+def desfase_host(host_name, dispersion):
+    """
+    Segundos de retraso de un host dentro del intervalo: determinista
+    (crc32 del nombre), así cada OLT cae siempre en el mismo punto.
+    """
+    if not dispersion:
+        return 0
+    return zlib.crc32(host_name.encode('utf-8')) % dispersion
+
+def _planificar_dag(tareas_a_ejecutar, intervalo):
+    """
+    Modo DAG: en lugar de encadenar principal -> modo -> secundario, cada
+    host es un nodo independiente. El bulk de un host solo espera al
+    discovery de ese mismo host; los hosts sin relación se lanzan en paralelo.
+    Las tareas llegan ordenadas por fase, que se conserva como orden de
+    encolado dentro de cada host.
+
+    Con SNMP_DESPACHO_DISPERSION_SEG cada host se lanza con su desfase
+    (desfase_host) en vez de todos al inicio del intervalo. La dispersión
+    se limita para que todo host arranque dentro de su propio intervalo.
+    """
+    por_host = defaultdict(lambda: {'desc': [], 'bulk': []})
+    for t in tareas_a_ejecutar:
+        if t.tipo == "descubrimiento":
+            por_host[t.host_name]['desc'].append(t.pk)
+        elif t.tipo in TIPOS_BULK:
+            por_host[t.host_name]['bulk'].append(t.pk)
+
+    dispersion = min(
+        getattr(settings, 'SNMP_DESPACHO_DISPERSION_SEG', 0),
+        INTERVALO_SEG - getattr(settings, 'SNMP_DESPACHO_MARGEN_SEG', 300)
+    )
+    logger.info(
+        f"[scheduler] DAG intervalo {intervalo}: {len(tareas_a_ejecutar)} tareas en "
+        f"{len(por_host)} hosts (dispersión {max(dispersion, 0)}s)"
+    )
+
+    if dispersion > 0:
+        for host_name, nodo in por_host.items():
+            _lanzar_host.apply_async(
+                (nodo['desc'], nodo['bulk'], host_name),
+                countdown=desfase_host(host_name, dispersion)
+            )
+        return
+
+    sin_discovery = []
+    for host_name, nodo in por_host.items():
+        if nodo['desc']:
+            _lanzar_host(nodo['desc'], nodo['bulk'], host_name)
+        else:
+            sin_discovery.extend(nodo['bulk'])
+
+    # Los hosts sin discovery no dependen de nada: un único encolado
+    _encolar_bulk(sin_discovery, "sin discovery")
+
 @shared_task(
-    name="snmp_scheduler.tasks.ejecutar_tareas_programadas",
-    queue="principal"
+    name="snmp_scheduler.tasks.ejecutar_tareas_programadas"
 )
 def ejecutar_tareas_programadas():
     """
@@ -193,36 +362,13 @@ def ejecutar_tareas_programadas():
     intervalo = get_current_interval(ahora)
     logger.info(f"[scheduler] Iniciando ejecución programada en intervalo {intervalo}")
 
-    # Obtener el intervalo actual
-    intervalos = get_intervals_to_execute(ahora)
-    logger.info(f"[scheduler] Intervalos a ejecutar: {intervalos}")
+    # Una sola consulta para todas las fases del intervalo
+    tareas = planificar_intervalo(ahora, intervalo)
 
-    # Obtenemos candidatas únicamente en modo PRINCIPAL para el intervalo actual
-    qs = TareaSNMP.objects.filter(
-        activa=True,
-        modo="principal",
-        intervalo=intervalo  # Buscar sin paréntesis
-    )
-    
-    logger.info(f"[scheduler] Encontradas {len(qs)} tareas principales para intervalo {intervalo}")
-    
-    # Luego filtramos por tiempo de ejecución
-    tareas_a_ejecutar = [t for t in qs if should_execute_task(t, ahora)]
-
-    desc_ids = [t.pk for t in tareas_a_ejecutar if t.tipo == "descubrimiento"]
-    bulk_ids = [t.pk for t in tareas_a_ejecutar if t.tipo in TIPOS_BULK]
-
-    logger.info(f"[scheduler] Fase 'principal': {len(desc_ids)} discovery, {len(bulk_ids)} bulk")
-    logger.info(f"[scheduler] Tareas a ejecutar: {[t.nombre for t in tareas_a_ejecutar]}")
-
-    # Si no hay discovery principal, arrancamos bulk y luego resto de fases
-    if not desc_ids:
-        logger.info("[scheduler] No hay tareas discovery en fase principal, pasando a bulk y siguientes fases")
-        _execute_bulk_and_next.delay([], bulk_ids, "principal", ["modo", "secundario"])
+    if getattr(settings, 'SNMP_SCHEDULER_MODO', 'fases') == 'dag':
+        _planificar_dag(tareas, intervalo)
         return
 
-    # Si hay discovery, uso chord para esperarlos y luego bulk+fases siguientes
-    header = [ejecutar_descubrimiento.s(tid) for tid in desc_ids]
-    callback = _execute_bulk_and_next.s(bulk_ids, "principal", ["modo", "secundario"])
-    chord(header)(callback)
-    logger.info(f"[scheduler] Chord discovery fase='principal' lanzado")
+    # Fase 'principal' en este mismo proceso; las siguientes se encadenan
+    # con los lotes ya calculados
+    _start_fase([], "principal", ["modo", "secundario"], _lotes_por_fase(tareas))
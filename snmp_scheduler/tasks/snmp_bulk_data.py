@@ -1,14 +1,15 @@
 # snmp_scheduler/tasks/snmp_bulk_data.py
 
+import asyncio
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction, close_old_connections, connections
-from pysnmp.hlapi import (
-    SnmpEngine, CommunityData, UdpTransportTarget,
-    ContextData, ObjectType, ObjectIdentity, getCmd
-)
+from django.db import close_old_connections, connections
 from .common import logger
-from ..models import TareaSNMP, EjecucionTareaSNMP, OnuDato
+from .onu_writer import aplicar_filas, filtrar_cambios
+from .poller_async import sondear_indices
+from .estado_tarea import abrir_ejecucion, cerrar_ejecucion
+from ..models import TareaSNMP, OnuDato
 
 @shared_task(
     bind=True,
@@ -16,16 +17,11 @@ from ..models import TareaSNMP, EjecucionTareaSNMP, OnuDato
     autoretry_for=(Exception,),
     max_retries=2,
     retry_backoff=180,
-    queue='principal',
     soft_time_limit=300
 )
 def ejecutar_bulk_data(self, tarea_id):
     # 1. Registrar inicio de ejecución
-    ejecucion = EjecucionTareaSNMP.objects.create(
-        tarea_id=tarea_id,
-        inicio=timezone.now(),
-        estado='E'
-    )
+    ejecucion = abrir_ejecucion(tarea_id)
 
     try:
         # Cerrar conexiones viejas antes de arrancar
@@ -34,86 +30,74 @@ def ejecutar_bulk_data(self, tarea_id):
         tarea = TareaSNMP.objects.get(id=tarea_id)
         logger.info(f"[bulk_data] Iniciando para host_name={tarea.host_name}")
 
-        # 2. Cargar ONUs existentes para este host_name
+        # 2. Cargar ONUs existentes para este host_name (con su valor actual)
         onus = list(
             OnuDato.objects
                    .filter(host=tarea.host_name)
-                   .values('id', 'snmpindexonu')
+                   .values('id', 'snmpindexonu', 'onudesc')
         )
 
         if not onus:
             logger.warning("[bulk_data] No ONUs para este host")
-            ejecucion.estado    = 'C'
             ejecucion.resultado = {'actualizadas': 0, 'eliminadas': 0}
-            ejecucion.fin       = timezone.now()
-            ejecucion.save()
+            cerrar_ejecucion(ejecucion, 'C')
             return ejecucion.resultado
 
-        base_oid  = tarea.get_oid()
-        comunidad = tarea.comunidad
-        host_ip   = tarea.host_ip
-
-        updated = 0
-        deleted = 0
+        idx_to_id = {onu['snmpindexonu']: onu['id'] for onu in onus}
+        actuales = {onu['id']: {'onudesc': onu['onudesc']} for onu in onus}
 
-        # 3. Procesar uno a uno (puedes paralelizar luego con cuidado)
-        for onu in onus:
-            oid_full = f"{base_oid}.{onu['snmpindexonu']}"
-            errorIndication, errorStatus, _, varBinds = next(
-                getCmd(
-                    SnmpEngine(),
-                    CommunityData(comunidad),
-                    UdpTransportTarget((host_ip, 161), timeout=3.0),
-                    ContextData(),
-                    ObjectType(ObjectIdentity(oid_full))
-                )
-            )
+        # 3. Un solo engine/transporte con una ventana de peticiones en vuelo;
+        #    la conexión a BD no se retiene durante la fase de red
+        connections.close_all()
+        valores, errores = asyncio.run(sondear_indices(
+            tarea.host_ip,
+            tarea.comunidad,
+            tarea.get_oid(),
+            list(idx_to_id),
+            por_pdu=getattr(settings, 'SNMP_GET_POR_PDU', 50),
+            ventana=getattr(settings, 'SNMP_GET_VENTANA', 8)
+        ))
+        for txt in errores:
+            logger.warning(f"[bulk_data] Error SNMP en {tarea.host_ip}: {txt}")
 
-            if errorIndication:
-                txt = str(errorIndication)
-                # Si no existe la instancia, borramos el registro
-                if 'NoSuchObject' in txt or 'NoSuchInstance' in txt:
-                    with transaction.atomic():
-                        OnuDato.objects.filter(id=onu['id']).delete()
-                    deleted += 1
-                    logger.debug(f"[bulk_data] Eliminada ONU id={onu['id']} por OID inválido")
-                else:
-                    logger.warning(f"[bulk_data] Ocurrió otro error SNMP en id={onu['id']}: {txt}")
-            else:
-                # Si status OK, actualizamos onudesc
-                new_val = varBinds[0][1].prettyPrint().strip('"')
-                with transaction.atomic():
-                    OnuDato.objects.filter(id=onu['id']).update(
-                        onudesc=new_val,
-                        fecha=timezone.now()
-                    )
-                updated += 1
-                logger.debug(f"[bulk_data] Actualizada ONU id={onu['id']} → '{new_val}'")
+        # Si no existe la instancia, borramos el registro
+        to_delete = [idx_to_id[idx] for idx, val in valores.items() if val is None]
+        filas, sin_cambios = filtrar_cambios(
+            {
+                idx_to_id[idx]: {'onudesc': val.strip('"')}
+                for idx, val in valores.items() if val is not None
+            },
+            actuales
+        )
 
-            # Cerrar todas las conexiones para liberar slots
-            for conn in connections.all():
-                conn.close()
+        # Escritura por lotes
+        updated, errores_bd = aplicar_filas(filas)
+        deleted = 0
+        if to_delete:
+            deleted, _ = OnuDato.objects.filter(id__in=to_delete).delete()
+            logger.debug(f"[bulk_data] Eliminadas {deleted} ONUs por OID inválido")
 
         # 4. Actualizar la propia TareaSNMP
         tarea.ultima_ejecucion  = timezone.now()
-        tarea.registros_activos = updated
+        tarea.registros_activos = updated + sin_cambios
         tarea.save(update_fields=['ultima_ejecucion', 'registros_activos'])
 
         # 5. Completar registro de ejecución
-        ejecucion.fin       = timezone.now()
-        ejecucion.estado    = 'C'
-        ejecucion.resultado = {'actualizadas': updated, 'eliminadas': deleted}
-        ejecucion.save()
+        ejecucion.resultado = {
+            'actualizadas': updated,
+            'sin_cambios': sin_cambios,
+            'eliminadas': deleted,
+            'errores': errores + errores_bd,
+        }
+        cerrar_ejecucion(ejecucion, 'C')
 
         logger.info(f"[bulk_data] Completado: {ejecucion.resultado}")
         return ejecucion.resultado
 
     except Exception as e:
         logger.error(f"[bulk_data] ERROR crítico: {e}", exc_info=True)
-        ejecucion.fin    = timezone.now()
-        ejecucion.estado = 'F'
         ejecucion.error  = str(e)[:500]
-        ejecucion.save()
+        cerrar_ejecucion(ejecucion, 'F')
         close_old_connections()
         # Reintentar tras backoff
         raise self.retry(exc=e, countdown=180)
\ No newline at end of file
@@ -1,85 +1,114 @@
 # snmp_scheduler/tasks/snmp_discovery.py
 
 from celery import shared_task
-from easysnmp import Session, EasySNMPError
-from django.db import connection
+from easysnmp import EasySNMPError
+from django.conf import settings
 from django.utils import timezone
-from ..models import TareaSNMP, EjecucionTareaSNMP
-from .common import logger
+from ..models import TareaSNMP, OnuDato
+from .common import logger, obtener_sesion, descartar_sesion
+from .estado_tarea import abrir_ejecucion, cerrar_ejecucion
+from .onu_writer import upsert_descubrimiento
+from .snmp_walker import recorrer_columna, paginar, en_segundo_plano
 
 @shared_task(
     bind=True,
     name='snmp_scheduler.tasks.ejecutar_descubrimiento',
     autoretry_for=(Exception,),
     max_retries=2,
-    retry_backoff=30,
-    queue='secundario'
+    retry_backoff=30
 )
 def ejecutar_descubrimiento(self, tarea_id):
     ejecucion = None
     try:
         # 1) Cargar tarea y crear registro de ejecución
         tarea = TareaSNMP.objects.get(pk=tarea_id)
-        ejecucion = EjecucionTareaSNMP.objects.create(
-            tarea=tarea,
-            estado='E',
-            inicio=timezone.now()
-        )
+        ejecucion = abrir_ejecucion(tarea.pk)
 
         # 2) Actualizar última ejecución en la tarea
         tarea.ultima_ejecucion = timezone.now()
         tarea.save(update_fields=['ultima_ejecucion'])
 
-        # 3) Preparar sesión EasySNMP y obtener el OID base de la tarea
-        session = Session(
-            hostname=tarea.host_ip,
-            community=tarea.comunidad,
-            version=2,
-            timeout=6,
-            retries=1
-        )
+        # 3) Sesión EasySNMP del pool del proceso y OID base de la tarea
+        session = obtener_sesion(tarea.host_ip, tarea.comunidad)
         base_oid = tarea.oid_consulta 
+        max_rep = getattr(settings, 'SNMP_BULK_MAX_REPETICIONES', 25)
+        lote = getattr(settings, 'SNMP_DISCOVERY_LOTE', 1000)
 
-        # 4) Hacer walk completo sobre el OID base
+        # 4) Conjunto actual del host: snmpindexonu -> (id, act_susp)
+        actuales = {
+            idx: (onu_id, act_susp)
+            for onu_id, idx, act_susp in OnuDato.objects
+                                                .filter(host=tarea.host_name)
+                                                .values_list('id', 'snmpindexonu', 'act_susp')
+                                                .iterator()
+        }
+
+        # 5) Recorrer la columna con GETBULK en un hilo y, a medida que llegan
+        #    las páginas, escribir solo ONUs nuevas o con act_susp distinto
+        completas = set()
+        paginas = en_segundo_plano(
+            paginar(recorrer_columna(session, base_oid, max_rep, completas), lote)
+        )
+        vistos = set()
+        insertadas = actualizadas = 0
         try:
-            vars = session.walk(base_oid)
+            for pagina in paginas:
+                filas = []
+                for snmpindexonu, valor in pagina:
+                    if not snmpindexonu or snmpindexonu in vistos:
+                        continue
+                    act_susp = (valor or '').strip().strip('"')
+                    vistos.add(snmpindexonu)
+                    previo = actuales.get(snmpindexonu)
+                    if previo is None:
+                        insertadas += 1
+                    elif previo[1] != act_susp:
+                        actualizadas += 1
+                    else:
+                        continue
+                    filas.append((snmpindexonu, act_susp))
+                # Upsert: si ya existe combinación (snmpindexonu, host) la actualiza
+                upsert_descubrimiento(tarea.host_name, filas)
         except EasySNMPError as e:
+            descartar_sesion(tarea.host_ip, tarea.comunidad)
             raise Exception(f"SNMP walk error: {e}")
+        except Exception:
+            # El hilo productor puede seguir usando la sesión hasta que
+            # termine su petición en curso: que nadie más la reciba del pool
+            descartar_sesion(tarea.host_ip, tarea.comunidad)
+            raise
+        finally:
+            paginas.close()
 
-        # 5) Insertar o actualizar en bloque usando cursor
-        with connection.cursor() as cursor:
-            for var in vars:
-                # var.oid: e.g.
-                # 'iso.3.6.1.4.1.2011.6.128.1.1.2.46.1.1.4194315776.22'
-                parts = var.oid.split('.')
-                if len(parts) < 2:
-                    logger.warning(f"[descubrimiento] OID demasiado corto: {var.oid}")
-                    continue
-
-                # Tomamos siempre las dos últimas sub-IDs
-                snmpindexonu = f"{parts[-2]}.{parts[-1]}"
-                act_susp = var.value.strip().strip('"')
+        # 6) Solo tras un recorrido completo: las ONUs que ya no aparecen se
+        #    borran en un único lote. Un recorrido cortado (respuesta vacía o
+        #    agente que no avanza) o vacío no borra nada: la OLT puede haber
+        #    respondido sin datos.
+        ausentes = [onu_id for idx, (onu_id, _) in actuales.items() if idx not in vistos]
+        eliminadas = 0
+        if ausentes and vistos and completas:
+            eliminadas, _ = OnuDato.objects.filter(id__in=ausentes).delete()
+        elif ausentes:
+            motivo = "recorrido incompleto" if vistos else "recorrido vacío"
+            logger.warning(f"[descubrimiento] {tarea.host_name}: {motivo}, no se borran {len(ausentes)} ONUs")
 
-                # Upsert: si ya existe combinación (snmpindexonu, host) la actualiza
-                cursor.execute("""
-                    INSERT INTO onu_datos (snmpindexonu, act_susp, host)
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (snmpindexonu, host)
-                    DO UPDATE SET act_susp = EXCLUDED.act_susp
-                """, [snmpindexonu, act_susp, tarea.host_name])
+        resultado = {
+            'insertadas': insertadas,
+            'actualizadas': actualizadas,
+            'sin_cambios': len(vistos) - insertadas - actualizadas,
+            'eliminadas': eliminadas,
+        }
+        logger.info(f"[descubrimiento] {tarea.host_name}: {resultado}")
 
-        # 6) Marcar ejecución como completa
-        ejecucion.estado = 'C'
-        ejecucion.fin = timezone.now()
-        ejecucion.save()
+        # 7) Marcar ejecución como completa
+        ejecucion.resultado = resultado
+        cerrar_ejecucion(ejecucion, 'C')
         return {"status": "success"}
 
     except Exception as e:
         logger.error(f"[descubrimiento] ERROR en tarea={tarea_id}: {e}", exc_info=True)
         if ejecucion:
-            ejecucion.estado = 'F'
-            ejecucion.fin = timezone.now()
             ejecucion.error = str(e)[:500]
-            ejecucion.save()
+            cerrar_ejecucion(ejecucion, 'F')
         # Reintentar según política de Celery
         raise self.retry(exc=e)
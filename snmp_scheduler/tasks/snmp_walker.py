@@ -0,0 +1,188 @@
+# snmp_scheduler/tasks/snmp_walker.py
+
+"""
+Recorrido de columnas SNMP con GETBULK paginado.
+
+En lugar de construir una lista de OIDs por índice y hacer un GET gigante,
+se pide la columna completa con GETBULK (max-repetitions configurable) y se
+devuelven los varbinds como generador, página a página.
+"""
+
+import queue
+import threading
+from .limitador_olt import turno_olt
+
+TIPOS_FIN = ('ENDOFMIBVIEW', 'NOSUCHOBJECT', 'NOSUCHINSTANCE')
+
+
+def normalizar_oid(oid):
+    """Convierte 'iso.3.6...' o '.1.3.6...' en '1.3.6...'."""
+    oid = oid.lstrip('.')
+    if oid.startswith('iso.'):
+        oid = '1.' + oid[4:]
+    return oid
+
+
+def oid_completo(var):
+    """OID numérico completo de un varbind de easysnmp (oid + oid_index)."""
+    oid = var.oid
+    if var.oid_index:
+        oid = f"{oid}.{var.oid_index}"
+    return normalizar_oid(oid)
+
+
+def indice_onu(oid):
+    """Las dos últimas sub-IDs del OID forman el snmpindexonu."""
+    parts = oid.split('.')
+    if len(parts) < 2:
+        return None
+    return f"{parts[-2]}.{parts[-1]}"
+
+
+def _fin_de_columna(var, prefijo):
+    """
+    True si el varbind marca el final real de la columna: un OID fuera del
+    subárbol o endOfMibView.
+    """
+    return not oid_completo(var).startswith(prefijo) or (var.snmp_type or '').upper() == 'ENDOFMIBVIEW'
+
+
+def recorrer_columna(session, base_oid, max_repeticiones=25, completas=None):
+    """
+    Generador que recorre la columna `base_oid` con GETBULK y produce
+    tuplas (snmpindexonu, valor) hasta salir del subárbol.
+
+    Si se pasa el conjunto `completas`, se añade `base_oid` solo cuando el
+    recorrido llega al final real de la columna. Una respuesta vacía, un
+    NoSuch* o un agente que no avanza cortan el recorrido sin anotarlo: el
+    llamador no debe tratar como ausentes las ONUs que no llegó a ver.
+    """
+    prefijo = normalizar_oid(base_oid) + '.'
+    siguiente = normalizar_oid(base_oid)
+
+    while True:
+        with turno_olt(session.hostname, max_repeticiones):
+            vars = session.get_bulk([siguiente], non_repeaters=0, max_repetitions=max_repeticiones)
+        if not vars:
+            return
+
+        ultimo = siguiente
+        for var in vars:
+            if _fin_de_columna(var, prefijo):
+                if completas is not None:
+                    completas.add(base_oid)
+                return
+            if (var.snmp_type or '').upper() in TIPOS_FIN:
+                return
+            ultimo = oid_completo(var)
+            yield indice_onu(ultimo), var.value
+
+        # Si el agente no avanza evitamos un bucle infinito
+        if ultimo == siguiente:
+            return
+        siguiente = ultimo
+
+
+def recorrer_columnas(session, columnas, max_repeticiones=25, completas=None):
+    """
+    Recorre varias columnas a la vez con GETBULK intercalados: cada petición
+    lleva el último OID de cada columna aún activa y el agente responde fila
+    por fila (col1, col2, ..., col1, col2, ...).
+
+    `columnas` es un dict {clave: base_oid}. Produce (clave, snmpindexonu, valor).
+    En `completas` se añaden las claves cuyas columnas llegaron a su final
+    real (ver recorrer_columna).
+    """
+    prefijos = {clave: normalizar_oid(oid) + '.' for clave, oid in columnas.items()}
+    siguientes = {clave: normalizar_oid(oid) for clave, oid in columnas.items()}
+
+    while siguientes:
+        activas = list(siguientes)
+        with turno_olt(session.hostname, max_repeticiones * len(activas)):
+            vars = session.get_bulk(
+                [siguientes[clave] for clave in activas],
+                non_repeaters=0,
+                max_repetitions=max_repeticiones
+            )
+        if not vars:
+            return
+
+        terminadas = set()
+        ultimos = dict(siguientes)
+        for pos, var in enumerate(vars):
+            clave = activas[pos % len(activas)]
+            if clave in terminadas:
+                continue
+            if _fin_de_columna(var, prefijos[clave]):
+                terminadas.add(clave)
+                if completas is not None:
+                    completas.add(clave)
+                continue
+            if (var.snmp_type or '').upper() in TIPOS_FIN:
+                terminadas.add(clave)
+                continue
+            oid = oid_completo(var)
+            ultimos[clave] = oid
+            yield clave, indice_onu(oid), var.value
+
+        for clave in activas:
+            # Si el agente no avanza en una columna la damos por terminada
+            # (sin anotarla como completa)
+            if clave in terminadas or ultimos[clave] == siguientes[clave]:
+                siguientes.pop(clave)
+            else:
+                siguientes[clave] = ultimos[clave]
+
+
+def paginar(iterable, tamano):
+    """Agrupa los elementos de `iterable` en listas de hasta `tamano`."""
+    pagina = []
+    for item in iterable:
+        pagina.append(item)
+        if len(pagina) >= tamano:
+            yield pagina
+            pagina = []
+    if pagina:
+        yield pagina
+
+
+def en_segundo_plano(iterable, max_pendientes=2):
+    """
+    Consume `iterable` en un hilo aparte y entrega sus elementos por una
+    cola acotada: mientras se escribe una página en BD ya se está pidiendo
+    la siguiente a la OLT, y la memoria queda limitada a `max_pendientes`.
+    Las excepciones del productor se relanzan en el consumidor.
+    """
+    cola = queue.Queue(maxsize=max_pendientes)
+    detener = threading.Event()
+
+    def poner(mensaje):
+        while not detener.is_set():
+            try:
+                cola.put(mensaje, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def productor():
+        try:
+            for item in iterable:
+                if not poner(('item', item)):
+                    return
+            poner(('fin', None))
+        except Exception as e:
+            poner(('error', e))
+
+    hilo = threading.Thread(target=productor, daemon=True)
+    hilo.start()
+    try:
+        while True:
+            tipo, valor = cola.get()
+            if tipo == 'fin':
+                return
+            if tipo == 'error':
+                raise valor
+            yield valor
+    finally:
+        detener.set()
@@ -1,3 +1,209 @@
-from django.test import TestCase
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from .tasks.carga_chunk import empaquetar_chunk, desempaquetar_chunk
+from .tasks.onu_writer import filtrar_cambios, huella
+from .tasks.normalizacion import a_dbm, a_dbm_olt_rx, a_metros, a_fecha, con_tipados, fila_metrica
+from .tasks.snmp_walker import recorrer_columna, recorrer_columnas
+
+
+class CargaChunkTests(SimpleTestCase):
+
+    def test_ida_y_vuelta(self):
+        filas = [
+            [10, '4194304000.1', huella('-2150')],
+            [11, '4194304000.2', huella('-2200')],
+            [12, '4194304000.3', None],
+            [40, '4194304256.7', huella('1')],
+        ]
+        carga = empaquetar_chunk(filas)
+        self.assertIsInstance(carga, str)
+        self.assertEqual(desempaquetar_chunk(carga), filas)
+
+    def test_huella_nula_se_conserva(self):
+        filas = [[1, '1.1', None], [2, '1.2', 0]]
+        self.assertEqual(desempaquetar_chunk(empaquetar_chunk(filas)), filas)
+
+    def test_tramos_no_contiguos(self):
+        filas = [[5, '1.9', 1], [3, '1.1', 2], [4, '2.1', 3]]
+        self.assertEqual(
+            desempaquetar_chunk(empaquetar_chunk(filas)),
+            [[3, '1.1', 2], [5, '1.9', 1], [4, '2.1', 3]]
+        )
+
+    def test_indice_no_numerico_viaja_sin_empaquetar(self):
+        filas = [[1, 'x.1', 7]]
+        self.assertIs(empaquetar_chunk(filas), filas)
+        self.assertIs(desempaquetar_chunk(filas), filas)
+
+
+class FiltrarCambiosTests(SimpleTestCase):
+
+    def test_huella(self):
+        self.assertIsNone(huella(None))
+        self.assertEqual(huella('-2150'), huella('-2150'))
+        self.assertNotEqual(huella('-2150'), huella('-2151'))
+        self.assertEqual(huella(5), huella('5'))
+
+    def test_solo_campos_cambiados(self):
+        filas = {1: {'potencia_rx': '-2150', 'estado_onu': '1'}, 2: {'potencia_rx': '-1900'}}
+        actuales = {1: {'potencia_rx': '-2150', 'estado_onu': '2'}, 2: {'potencia_rx': '-1900'}}
+        cambiadas, sin_cambio = filtrar_cambios(filas, actuales)
+        self.assertEqual(cambiadas, {1: {'estado_onu': '1'}})
+        self.assertEqual(sin_cambio, 1)
+
+    def test_onu_sin_valores_previos(self):
+        cambiadas, sin_cambio = filtrar_cambios({3: {'potencia_rx': '-2150'}}, {})
+        self.assertEqual(cambiadas, {3: {'potencia_rx': '-2150'}})
+        self.assertEqual(sin_cambio, 0)
+
+    def test_comparacion_por_huella(self):
+        actuales = {1: {'potencia_rx': huella('-2150')}, 2: {'potencia_rx': None}}
+        filas = {1: {'potencia_rx': '-2150'}, 2: {'potencia_rx': '-1900'}}
+        cambiadas, sin_cambio = filtrar_cambios(filas, actuales, huella)
+        self.assertEqual(cambiadas, {2: {'potencia_rx': '-1900'}})
+        self.assertEqual(sin_cambio, 1)
+
+
+class NormalizacionTests(SimpleTestCase):
+
+    def test_dbm_en_centesimas(self):
+        self.assertEqual(a_dbm('-2150'), -21.5)
+        self.assertEqual(a_dbm('"85"'), 0.85)
+
+    def test_dbm_ya_formateado(self):
+        self.assertEqual(a_dbm('-21.50'), -21.5)
+
+    def test_dbm_sin_dato(self):
+        self.assertIsNone(a_dbm('2147483647'))
+        self.assertIsNone(a_dbm('No identificado'))
+        self.assertIsNone(a_dbm(None))
+
+    def test_dbm_olt_rx_con_desplazamiento(self):
+        self.assertEqual(a_dbm_olt_rx('7850'), -21.5)
+        self.assertEqual(a_dbm_olt_rx('-21.50'), -21.5)
+        self.assertIsNone(a_dbm_olt_rx('2147483647'))
+
+    def test_metros(self):
+        self.assertEqual(a_metros('12345'), 12345)
+        self.assertEqual(a_metros('12.345 km'), 12345)
+        self.assertIsNone(a_metros('-1'))
+        self.assertIsNone(a_metros('No Distancia'))
+
+    def test_fecha_texto(self):
+        mas_dos = dt_timezone(timedelta(hours=2))
+        self.assertEqual(a_fecha('2024-05-01 10:20:30+02:00'), datetime(2024, 5, 1, 10, 20, 30, tzinfo=mas_dos))
+        self.assertEqual(a_fecha('2024-05-01 10:20:30'), datetime(2024, 5, 1, 10, 20, 30, tzinfo=dt_timezone.utc))
+
+    def test_fecha_octetos(self):
+        esperada = datetime(2024, 5, 1, 10, 20, 30, tzinfo=dt_timezone(timedelta(hours=2)))
+        octetos = bytes([0x07, 0xE8, 5, 1, 10, 20, 30, 0, ord('+'), 2, 0])
+        self.assertEqual(a_fecha('07 E8 05 01 0A 14 1E 00 2B 02 00'), esperada)
+        self.assertEqual(a_fecha(octetos.decode('latin-1')), esperada)
+        self.assertEqual(a_fecha('07 E8 05 01 0A 14 1E 00'), esperada.replace(tzinfo=dt_timezone.utc))
+
+    def test_fecha_invalida(self):
+        self.assertIsNone(a_fecha(''))
+        self.assertIsNone(a_fecha('basura'))
+
+    def test_con_tipados_anula_texto_no_interpretable(self):
+        self.assertEqual(
+            con_tipados({'potencia_rx': 'No identificado', 'estado_onu': '1'}),
+            {'potencia_rx': 'No identificado', 'estado_onu': '1', 'potencia_rx_dbm': None}
+        )
+
+    def test_fila_metrica(self):
+        self.assertEqual(
+            fila_metrica({'potencia_rx': '7850', 'estado_onu': '1', 'onudesc': 'x', 'potencia_tx': 'No identificado'}),
+            {'potencia_rx': -21.5, 'estado': 1}
+        )
+
+
+Varbind = namedtuple('Varbind', 'oid oid_index value snmp_type')
+
+BASE = '1.3.6.1.4.1.2011.6.128.1.1.2.46.1.15'
+OTRA = '1.3.6.1.4.1.2011.6.128.1.1.2.46.1.18'
+
+
+def vb(base, indice, valor='1', tipo='INTEGER'):
+    return Varbind(f"{base}.{indice}", '', valor, tipo)
+
+
+class SesionFalsa:
+    """Sesión easysnmp que responde a cada get_bulk con la siguiente página."""
+
+    hostname = '10.0.0.1'
+
+    def __init__(self, paginas):
+        self.paginas = list(paginas)
+        self.peticiones = []
+
+    def get_bulk(self, oids, non_repeaters=0, max_repetitions=25):
+        self.peticiones.append(list(oids))
+        return self.paginas.pop(0) if self.paginas else []
+
+
+@override_settings(SNMP_LIMITE_ACTIVO=False)
+class RecorrerColumnaTests(SimpleTestCase):
+
+    def recorrer(self, paginas):
+        completas = set()
+        sesion = SesionFalsa(paginas)
+        pares = list(recorrer_columna(sesion, BASE, 2, completas))
+        return pares, completas, sesion
+
+    def test_completo_al_salir_del_subarbol(self):
+        pares, completas, sesion = self.recorrer([
+            [vb(BASE, '4194304000.1'), vb(BASE, '4194304000.2')],
+            [vb(BASE, '4194304000.3', '2'), vb(OTRA, '4194304000.1')],
+        ])
+        self.assertEqual(pares, [('4194304000.1', '1'), ('4194304000.2', '1'), ('4194304000.3', '2')])
+        self.assertEqual(completas, {BASE})
+        self.assertEqual(sesion.peticiones[1], [f"{BASE}.4194304000.2"])
+
+    def test_completo_con_end_of_mib_view(self):
+        pares, completas, _ = self.recorrer([
+            [vb(BASE, '1.1'), Varbind(f"{BASE}.1.1", '', '', 'ENDOFMIBVIEW')],
+        ])
+        self.assertEqual(pares, [('1.1', '1')])
+        self.assertEqual(completas, {BASE})
+
+    def test_respuesta_vacia_lo_deja_incompleto(self):
+        pares, completas, _ = self.recorrer([
+            [vb(BASE, '1.1'), vb(BASE, '1.2')],
+            [],
+        ])
+        self.assertEqual(pares, [('1.1', '1'), ('1.2', '1')])
+        self.assertEqual(completas, set())
+
+    def test_agente_sin_avance_lo_deja_incompleto(self):
+        pares, completas, sesion = self.recorrer([
+            [vb(BASE, '1.1'), vb(BASE, '1.2')],
+            [vb(BASE, '1.2')],
+            [vb(BASE, '1.3')],
+        ])
+        self.assertEqual(completas, set())
+        self.assertEqual(len(sesion.peticiones), 2)
+
+    def test_no_such_object_lo_deja_incompleto(self):
+        pares, completas, _ = self.recorrer([
+            [Varbind(f"{BASE}.1.1", '', '', 'NOSUCHOBJECT')],
+        ])
+        self.assertEqual(pares, [])
+        self.assertEqual(completas, set())
+
+    def test_varias_columnas(self):
+        completas = set()
+        sesion = SesionFalsa([
+            [vb(BASE, '1.1'), vb(OTRA, '1.1', '5'), vb(BASE, '1.2'), vb(OTRA, '1.2', '6')],
+            [vb(OTRA, '1.1'), vb(OTRA, '1.3', '7')],
+            [],
+        ])
+        filas = list(recorrer_columnas(sesion, {'a': BASE, 'b': OTRA}, 2, completas))
+        self.assertEqual(filas, [
+            ('a', '1.1', '1'), ('b', '1.1', '5'), ('a', '1.2', '1'), ('b', '1.2', '6'), ('b', '1.3', '7'),
+        ])
+        # 'a' salió de su subárbol; 'b' se cortó con una respuesta vacía
+        self.assertEqual(completas, {'a'})
@@ -38,15 +38,15 @@ def snmp_programmer_view(request):
     # Apply distance range filter
     selected_range = request.GET.get('distance_range')
     if selected_range:
-        # Convert distance_m to float for comparison
+        # distancia_metros es la columna numérica (con índice) derivada de distancia_m
         if selected_range == '0-5':
-            onus = onus.filter(Q(distancia_m__gte=0) & Q(distancia_m__lt=5000))
+            onus = onus.filter(Q(distancia_metros__gte=0) & Q(distancia_metros__lt=5000))
         elif selected_range == '5-10':
-            onus = onus.filter(Q(distancia_m__gte=5000) & Q(distancia_m__lt=10000))
+            onus = onus.filter(Q(distancia_metros__gte=5000) & Q(distancia_metros__lt=10000))
         elif selected_range == '10-15':
-            onus = onus.filter(Q(distancia_m__gte=10000) & Q(distancia_m__lt=15000))
+            onus = onus.filter(Q(distancia_metros__gte=10000) & Q(distancia_metros__lt=15000))
         elif selected_range == '15+':
-            onus = onus.filter(distancia_m__gte=15000)
+            onus = onus.filter(distancia_metros__gte=15000)
 
     context = {
         'onus': onus,